@@ -0,0 +1,163 @@
+"""
+Batch evaluation of xray_delta_beta and material_mu for many
+(material, density, energy) jobs, spread over a pool of processes.
+
+Each worker process opens the X-ray database once and keeps the
+Material objects it has built, so the database setup and formula
+parsing are paid once per worker instead of once per job.
+
+    >>> from nist_lookup.batch import batch_delta_beta
+    >>> energies = np.linspace(10e3, 50e3, 401)
+    >>> jobs = [('SiO2', 2.2, energies), ('Au', 19.3, energies)]
+    >>> delta, beta, atlen = batch_delta_beta(jobs)
+    >>> delta.shape
+    (2, 401)
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+
+from nist_lookup.xraydb import xrayDB, get_xraydb
+from nist_lookup.materials import Material, material_get
+
+# xrayDB of a worker process, set by _init_worker
+_worker_xdb = None
+
+
+def _init_worker(preload):
+    "open the database once per worker process"
+    global _worker_xdb
+    _worker_xdb = xrayDB(preload=preload)
+    _get_material.cache_clear()
+
+
+@lru_cache(maxsize=256)
+def _get_material(name):
+    """Material for name, shared by all jobs with the same name: jobs
+    pass their own density, so unknown formulas are built with a
+    placeholder density"""
+    xdb = _worker_xdb
+    if xdb is None:
+        xdb = get_xraydb()
+    density = None
+    if material_get(name) is None:
+        density = 1.0
+    return Material(name, density, xdb=xdb)
+
+
+def _job_material(material, density):
+    "Material and density for a job"
+    if density is None:
+        if material_get(material) is None:
+            raise Warning("must give density for unknown material '%s'"
+                          % material)
+        density = _get_material(material).density
+    return _get_material(material), density
+
+
+def _delta_beta_job(args):
+    (material, density, energy), photo_only = args
+    mat, density = _job_material(material, density)
+    return mat.delta_beta(energy, density=density, photo_only=photo_only)
+
+
+def _mu_job(args):
+    (material, density, energy), kind = args
+    mat, density = _job_material(material, density)
+    return mat.mu(energy, kind=kind, density=density)
+
+
+def _as_job(job):
+    "(material, density, energy) with hashable density"
+    material, density, energy = job
+    if density is not None:
+        density = float(density)
+    return (material, density, np.asarray(energy, dtype=float))
+
+
+def _run(func, jobs, option, max_workers, chunksize, preload):
+    "evaluate func for all jobs, returning results in input order"
+    args = [(_as_job(job), option) for job in jobs]
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = min(max_workers, len(args))
+    if max_workers <= 1:
+        return [func(arg) for arg in args]
+    with ProcessPoolExecutor(max_workers=max_workers,
+                             initializer=_init_worker,
+                             initargs=(preload,)) as pool:
+        return list(pool.map(func, args, chunksize=chunksize))
+
+
+def _gather(results):
+    """stack results into one array when they all have the same shape,
+    otherwise return the list of arrays"""
+    results = [np.asarray(r) for r in results]
+    if len(results) > 0 and all(r.shape == results[0].shape
+                                for r in results):
+        return np.array(results)
+    return results
+
+
+def batch_delta_beta(jobs, photo_only=False, max_workers=None,
+                     chunksize=8, preload=True):
+    """xray_delta_beta() for many jobs
+
+    arguments
+    ---------
+     jobs:         sequence of (material, density, energy) tuples, with
+                   energy a value or an array of energies in eV
+     photo_only:   use only photo-absorption for beta (default False)
+     max_workers:  number of worker processes (default: number of CPUs),
+                   if 1 or less, jobs are evaluated in this process
+     chunksize:    number of jobs sent to a worker at a time
+     preload:      whether workers preload the database tables into memory
+
+    returns
+    -------
+     (delta, beta, atlen), each an array of shape (n_jobs,) + energy.shape
+     if all energy grids have the same shape, or a list of arrays otherwise.
+     Results are in the order of jobs, and do not depend on max_workers.
+    """
+    results = _run(_delta_beta_job, jobs, photo_only, max_workers,
+                   chunksize, preload)
+    return tuple(_gather([r[i] for r in results]) for i in range(3))
+
+
+def batch_material_mu(jobs, kind='total', max_workers=None,
+                      chunksize=8, preload=True):
+    """material_mu() for many jobs
+
+    arguments
+    ---------
+     jobs:         sequence of (material, density, energy) tuples, with
+                   density None for known materials
+     kind:         'photo' or 'total' (default) cross-section
+     max_workers:  number of worker processes (default: number of CPUs),
+                   if 1 or less, jobs are evaluated in this process
+     chunksize:    number of jobs sent to a worker at a time
+     preload:      whether workers preload the database tables into memory
+
+    returns
+    -------
+     mu in 1/cm, an array of shape (n_jobs,) + energy.shape if all energy
+     grids have the same shape, or a list of arrays otherwise.
+    """
+    return _gather(_run(_mu_job, jobs, kind, max_workers,
+                        chunksize, preload))
+
+
+if __name__ == '__main__':
+    import time
+    energies = np.linspace(5e3, 60e3, 501)
+    formulas = ('SiO2', 'Au', 'Si', 'Fe2O3', 'CaCO3', 'H2O', 'Ni', 'W',
+                'C22H10N2O5', 'Al2O3')
+    jobs = [(f, 1.0 + 0.1*i, energies) for i in range(50) for f in formulas]
+    for workers in (1, None):
+        t0 = time.time()
+        delta, beta, atlen = batch_delta_beta(jobs, max_workers=workers)
+        mu = batch_material_mu(jobs, max_workers=workers)
+        print('max_workers=%s: %d jobs, %.3f s' % (workers, len(jobs),
+                                                   time.time() - t0))
@@ -17,7 +17,10 @@
 #   Matt Newville  Univ Chicago  Jan-2013
 #
 
-from re import compile as re_compile
+from re import compile as re_compile, DOTALL
+from functools import lru_cache
+
+import numpy as np
 
 
 class Element:
@@ -46,6 +49,9 @@ for sym in (
         'Zr'):
     ELEMENTS[sym] = Element(sym)
 
+# column of each element in chemparse_many(..., matrix=True)
+ELEMENT_INDEX = dict((sym, i) for i, sym in enumerate(ELEMENTS))
+
 
 class ElementSequence:
     def __init__(self, *seq):
@@ -145,6 +151,79 @@ class ChemFormulaParser(object):
         return seq
 
 
+# all tokens of a formula in one pass: element name, number, parentheses,
+# <EOS>, and any other single character, which is an error when reached
+TOKENS = re_compile(
+    r"([A-Z][a-z]*)|([0-9]+\.?[0-9]*(?:[eE][-+]?[0-9]+)?)|(\()|(\))|(<EOS>)|(.)",
+    DOTALL).findall
+
+
+def _parse_error(msg, formula, tokens, itok):
+    "raise ValueError with the same message as Tokenizer.error()"
+    pos = sum(len(''.join(tok)) for tok in tokens[:itok])
+    raise ValueError(msg + ":\n" + formula + "\n" + " " * pos + "^\n")
+
+
+def _parse_formula(formula):
+    """single-pass chemical formula parser, giving the same results and
+    error messages as ChemFormulaParser, without building an object tree.
+
+    every element occurrence is kept with the counts of the groups
+    it is in (innermost first), and the weights are multiplied outermost
+    first at the end, exactly as ElementSequence.add() does.
+    """
+    tokens = TOKENS(formula)
+    tokens.append(('', '', '', '', '<EOS>', ''))
+    groups = [[]]
+    itok = 0
+    while True:
+        name, num, lparen, rparen, eos, bad = tokens[itok]
+        if bad:
+            _parse_error("unrecognized element or number",
+                         formula, tokens, itok)
+        if name:
+            if name not in ELEMENTS:
+                _parse_error("'" + name + "' is not an element symbol",
+                             formula, tokens, itok)
+            item = [(name, [])]
+        elif lparen:
+            groups.append([])
+            itok += 1
+            continue
+        elif rparen and len(groups) > 1:
+            item = groups.pop()
+        elif len(groups) > 1:
+            _parse_error("expected right paren", formula, tokens, itok)
+        elif not eos:
+            _parse_error("expected end of input", formula, tokens, itok)
+        else:
+            break
+
+        # element or group, followed by optional count
+        itok += 1
+        count = 1
+        num = tokens[itok][1]
+        if num:
+            count = float(num)
+            itok += 1
+        for sym, counts in item:
+            counts.append(count)
+        groups[-1].extend(item)
+
+    out = {}
+    for sym, counts in groups[0]:
+        weight = 1
+        for count in reversed(counts):
+            weight = weight * count
+        out[sym] = out.get(sym, 0) + weight
+    return out
+
+
+@lru_cache(maxsize=4096)
+def _chemparse_cached(formula):
+    return _parse_formula(formula)
+
+
 def chemparse(formula):
     '''parse a chemical formula to a dictionary of elemental abundances
 
@@ -165,11 +244,80 @@ proper capitalization must be used:
     ValueError: unrecognized element or number:
     co
     ^
+
+Results for the last 4096 formulas are cached, each call returns
+a new dictionary.
     '''
-    p = ChemFormulaParser()
-    return p.parse(formula)
+    return dict(_chemparse_cached(formula))
+
+
+def chemparse_many(formulas, errors=None, matrix=False):
+    """parse many chemical formulas
+
+    arguments
+    ---------
+     formulas:  iterable of chemical formulas
+     errors:    optional list, to which (index, formula, message) is
+                appended for each formula that cannot be parsed,
+                including items that are not strings
+     matrix:    if True, return a dense stoichiometry matrix
+
+    returns
+    -------
+     if matrix is False, a generator of compositions (as from chemparse())
+     in the order of formulas, with None for formulas that cannot be parsed.
+
+     if matrix is True, a (n_formulas x n_elements) array of abundances,
+     with columns in the order of ELEMENTS (see ELEMENT_INDEX), and rows
+     of NaN for formulas that cannot be parsed.
+
+    each distinct formula is parsed only once.  Errors do not stop the
+    parsing of the remaining formulas.
+
+    >>> list(chemparse_many(['H2O', 'co', 'H2O']))
+    [{'H': 2.0, 'O': 1}, None, {'H': 2.0, 'O': 1}]
+    """
+    compositions = _chemparse_stream(formulas, errors)
+    if not matrix:
+        return compositions
+    rows = []
+    for comp in compositions:
+        row = np.zeros(len(ELEMENT_INDEX))
+        if comp is None:
+            row[:] = np.nan
+        else:
+            for sym, amount in comp.items():
+                row[ELEMENT_INDEX[sym]] = amount
+        rows.append(row)
+    if len(rows) == 0:
+        return np.zeros((0, len(ELEMENT_INDEX)))
+    return np.array(rows)
+
+
+def _chemparse_stream(formulas, errors):
+    "generator for chemparse_many()"
+    seen = {}
+    for i, formula in enumerate(formulas):
+        if not isinstance(formula, str):
+            if errors is not None:
+                errors.append((i, formula, "formula must be a string, not %s"
+                               % type(formula).__name__))
+            yield None
+            continue
+        if formula not in seen:
+            try:
+                seen[formula] = (_chemparse_cached(formula), None)
+            except ValueError as exc:
+                seen[formula] = (None, str(exc))
+        comp, msg = seen[formula]
+        if msg is not None and errors is not None:
+            errors.append((i, formula, msg))
+        yield None if comp is None else dict(comp)
 
 if __name__ == '__main__':
+    import random
+    import time
+
     examples = ('H2O',  'Mg(SO4)2',
                 'Mn(SO4)2(H2O)7',
                 'Mg0.5Fe0.5', 'Ti0.01Fe0.99(OH)2', 'Mg(FeO2)(H2O)3')
@@ -177,3 +325,32 @@ if __name__ == '__main__':
     for formula in examples:
         print('=== %s ' % formula)
         print(parser.parse(formula))
+
+    def random_formula(rng, depth=0):
+        out = []
+        for _ in range(rng.randint(1, 4)):
+            if depth < 2 and rng.random() < 0.25:
+                out.append('(%s)' % random_formula(rng, depth+1))
+            else:
+                out.append(rng.choice(sorted(ELEMENTS)))
+            if rng.random() < 0.6:
+                out.append(rng.choice(('2', '3', '0.5', '1.e-3', '12')))
+        return ''.join(out)
+
+    # micro-benchmark: the examples many times, and a generated corpus
+    rng = random.Random(0)
+    corpus = [random_formula(rng) for _ in range(20000)]
+    for name, formulas, repeat in (('examples', examples, 5000),
+                                   ('corpus', corpus, 3)):
+        formulas = list(formulas) * repeat
+        for formula in set(formulas):
+            assert parser.parse(formula) == _parse_formula(formula)
+        for label, func in (('ChemFormulaParser', parser.parse),
+                            ('_parse_formula', _parse_formula),
+                            ('chemparse (cached)', chemparse)):
+            _chemparse_cached.cache_clear()
+            t0 = time.time()
+            for formula in formulas:
+                func(formula)
+            print('%-9s %-20s %7d formulas: %.3f s' % (
+                name, label, len(formulas), time.time() - t0))
@@ -1,20 +1,27 @@
 import os
+from math import pi
+
 import numpy as np
 
-from nist_lookup.xraydb_plugin import mu_elam, atomic_mass
+from nist_lookup.physical_constants import R_ELECTRON_CM, AVOGADRO, PLANCK_HC
 from nist_lookup.chemparser import chemparse
+from nist_lookup.xraydb import (get_xraydb, SplineCache, ElamTables,
+                                chantler_columns, elam_cross_section,
+                                chunked)
 
 
-def get_materials():
-    """return _materials dictionary, creating it if needed"""
-    mat = {}
+BUNDLED_MATERIALS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 'materials.dat')
+USER_MATERIALS = os.path.join(os.path.expanduser('~'), '.nist_lookup',
+                              'materials.dat')
 
-    fname = 'materials.dat'
-    if os.path.exists(fname):
-        fh = open(fname, 'r')
-        lines = fh.readlines()
-        fh.close()
-        for line in lines:
+
+def read_materials(fname):
+    """read materials file, return dictionary of
+    lower-case name -> (formula, density)"""
+    mat = {}
+    with open(fname, 'r') as fh:
+        for line in fh:
             line = line.strip()
             if len(line) > 2 and not line.startswith('#'):
                 name, f, den = [i.strip() for i in line.split('|')]
@@ -22,7 +29,311 @@ def get_materials():
     return mat
 
 
-def material_mu(name, energy, density=None, kind='total'):
+def _file_stamp(fname):
+    "(mtime, size) of a file, or None if it does not exist"
+    try:
+        stat = os.stat(fname)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class MaterialsRegistry(object):
+    """materials read from a list of files, later files taking precedence.
+
+    each file is read once, and read again only when its modification
+    time or size changes.  add() appends to the last file.
+    """
+    def __init__(self, filenames=(BUNDLED_MATERIALS, USER_MATERIALS)):
+        self.filenames = list(filenames)
+        self._files = {}
+        self._materials = {}
+
+    def _refresh(self):
+        "re-read files that changed, merge if anything changed"
+        changed = False
+        for fname in self.filenames:
+            stamp = _file_stamp(fname)
+            cached = self._files.get(fname, None)
+            if cached is not None and cached[0] == stamp:
+                continue
+            changed = True
+            if stamp is None:
+                self._files[fname] = (None, {})
+            else:
+                self._files[fname] = (stamp, read_materials(fname))
+        if changed:
+            self._merge()
+        return self._materials
+
+    def _merge(self):
+        materials = {}
+        for fname in self.filenames:
+            materials.update(self._files[fname][1])
+        self._materials = materials
+
+    def all(self):
+        "return dictionary of all materials"
+        return self._refresh()
+
+    def get(self, name):
+        "return (formula, density) for material name, or None"
+        return self._refresh().get(name.lower(), None)
+
+    def add(self, name, formula, density):
+        """add material, appending it to the last (user) file"""
+        self._refresh()
+        formula = formula.replace(' ', '')
+        fname = self.filenames[-1]
+        if _file_stamp(fname) is None:
+            dirname = os.path.dirname(fname)
+            if dirname and not os.path.exists(dirname):
+                os.makedirs(dirname)
+            text = ['# user-specific database of materials\n',
+                    '# name, formula, density\n']
+        else:
+            text = []
+        text.append(" %s | %s | %g\n" % (name, formula, density))
+        with open(fname, 'a') as fh:
+            fh.write(''.join(text))
+
+        stamp, materials = self._files.get(fname, (None, {}))
+        materials = dict(materials)
+        materials[name.lower()] = (formula, float(density))
+        self._files[fname] = (_file_stamp(fname), materials)
+        self._merge()
+
+
+_registry = MaterialsRegistry()
+
+
+def set_materials_files(filenames=(BUNDLED_MATERIALS, USER_MATERIALS)):
+    """read the materials of the module-level functions from filenames
+    instead, later files taking precedence; material_add() appends to
+    the last one.  Without arguments, go back to the bundled and the
+    user file."""
+    global _registry
+    _registry = MaterialsRegistry(filenames)
+
+
+def get_materials():
+    """return dictionary of all materials, from the bundled materials.dat
+    and the user file (~/.nist_lookup/materials.dat)"""
+    return dict(_registry.all())
+
+
+class Material(object):
+    """material from the materials list or a chemical formula,
+    resolved once and evaluated many times.
+
+    arguments
+    ---------
+     name:     name of material from materials list or chemical compound
+     density:  material density (gr/cm^3).  If None, and material is a
+               known material, that density will be used.
+     xdb:      xrayDB instance used to look up the element tables,
+               the shared get_xraydb() instance if None
+
+    the composition, atomic masses, mass fractions and the Elam and
+    Chantler tables of all elements are read at construction (elements
+    without Chantler data, Np to Cf, can be used with mu() but not with
+    delta_beta()).  The
+    object does not keep a reference to xdb, so it can be pickled
+    and sent to other processes.
+
+    example
+    -------
+      >>> water = Material('H2O', 1.0)
+      >>> water.mu(10000.0)
+      5.32986401658495
+    """
+    def __init__(self, name, density=None, xdb=None):
+        if xdb is None:
+            xdb = get_xraydb()
+        formula, density = _resolve(name, density, 'Material')
+
+        self.name = name
+        self.formula = formula
+        self.density = density
+        self.composition = chemparse(formula)
+        self.elements = list(self.composition.keys())
+        self.numbers = np.array([self.composition[e] for e in self.elements],
+                                dtype=float)
+        self.atomic_numbers = [xdb.atomic_number(e) for e in self.elements]
+        self.atomic_masses = np.array([xdb.atomic_mass(e)
+                                       for e in self.elements])
+        self.mass = float(np.sum(self.numbers * self.atomic_masses))
+        self.mass_fractions = self.numbers * self.atomic_masses / self.mass
+
+        self._elam = {}
+        self._chantler = {}
+        for elem in self.elements:
+            self._elam[elem] = dict((kind, xdb._getElamArrays(elem, kind))
+                                    for kind in ('photo', 'coh', 'incoh'))
+            arrays = xdb._getChantlerArrays(
+                elem, ('energy', 'f1', 'f2', 'mu_photo', 'mu_total'))
+            if arrays is None:
+                # no Chantler data (Np to Cf): mu() only needs Elam
+                self._chantler[elem] = None
+                continue
+            self._chantler[elem] = (arrays[0], dict(
+                zip(('f1', 'f2', 'mu_photo', 'mu_total'), arrays[1:])),
+                xdb.chantler_breaks(elem))
+        self._elam_tables = dict(
+            (kind, ElamTables([self._elam[e][kind] for e in self.elements]))
+            for kind in ('photo', 'coh', 'incoh'))
+        self.spline_cache = SplineCache()
+
+    def __repr__(self):
+        return "<Material(%s, %g)>" % (self.formula, self.density)
+
+    def mu_elam(self, element, energy, kind='total'):
+        """mass attenuation coefficient (cm^2/gr) from Elam tables for
+        one element of the material, see xrayDB.mu_elam"""
+        tabs = self._elam[element]
+        xsec = elam_cross_section(*(tabs['photo'] + (energy,)))
+        if kind.lower().startswith('tot'):
+            xsec += elam_cross_section(*(tabs['coh'] + (energy,)))
+            xsec += elam_cross_section(*(tabs['incoh'] + (energy,)))
+        return xsec
+
+    def mu(self, energy, kind='total', density=None, chunk_size=None,
+           out=None):
+        """X-ray attenuation coefficient (in 1/cm) at energy (in eV)
+        from Elam tables.
+
+        kind:     'photo' or 'total' (default) for whether to
+                  use photo-absorption or total cross-section.
+        density:  density to use instead of self.density
+        chunk_size, out:  if either is given, energies are evaluated in
+                  blocks of chunk_size, and written to the array out.
+        """
+        if density is None:
+            density = self.density
+        if chunk_size is not None or out is not None:
+            return chunked(lambda e: self.mu(e, kind=kind, density=density),
+                           [energy], chunk_size=chunk_size, out=out)
+        return _mass_weighted_mu(self.numbers * self.atomic_masses,
+                                 self.mu_elam_matrix(energy, kind=kind),
+                                 density)
+
+    def mu_elam_matrix(self, energy, kind='total'):
+        """mass attenuation coefficients (cm^2/gr) from Elam tables for
+        all elements of the material, an array of shape
+        (len(self.elements),) + energy.shape"""
+        xsec = self._elam_tables['photo'].evaluate(energy)
+        if kind.lower().startswith('tot'):
+            xsec += self._elam_tables['coh'].evaluate(energy)
+            xsec += self._elam_tables['incoh'].evaluate(energy)
+        return xsec
+
+    def components(self, energy, kind='total'):
+        """dictionary of data for constructing mu per element,
+        see material_mu_components()"""
+        out = {'mass': 0.0, 'density': self.density, 'elements': []}
+        for elem, mass in zip(self.elements, self.atomic_masses):
+            number, mass = self.composition[elem], float(mass)
+            out['mass'] += number*mass
+            out[elem] = (number, mass,
+                         self.mu_elam(elem, energy, kind=kind))
+            out['elements'].append(elem)
+        return out
+
+    def delta_beta(self, energy, density=None, photo_only=False,
+                   chunk_size=None, out=None):
+        """anomalous components of the index of refraction from
+        Chantler tables, see xraydb_plugin.xray_delta_beta()
+
+        with chunk_size or out given, energies (and densities) are
+        evaluated in blocks of chunk_size, and written to out, a tuple
+        of 3 arrays.
+
+        raises ValueError if an element of the material has no Chantler
+        data (Np to Cf).
+
+        returns (delta, beta, attenuation length in cm)
+        """
+        missing = [e for e in self.elements if self._chantler[e] is None]
+        if missing:
+            raise ValueError("no Chantler data for %s in '%s'"
+                             % (', '.join(missing), self.formula))
+        if density is None:
+            density = self.density
+        if chunk_size is not None or out is not None:
+            erange = (np.min(energy), np.max(energy))
+            return chunked(lambda e, d: self._delta_beta(e, d, photo_only,
+                                                         erange),
+                           [energy, density], chunk_size=chunk_size, out=out)
+        return self._delta_beta(energy, density, photo_only)
+
+    def _delta_beta(self, energy, density, photo_only, erange=None):
+        "delta_beta(), with the energy range for the Chantler tables"
+        energy = np.asarray(energy, dtype=float)
+        density = np.asarray(density, dtype=float)
+        lamb_cm = 1.e-8 * PLANCK_HC / energy  # lambda in cm
+
+        total_mass, delta, beta_photo, beta_total = 0, 0, 0, 0
+        for elem, z, mass in zip(self.elements, self.atomic_numbers,
+                                 self.atomic_masses):
+            te, tables, breaks = self._chantler[elem]
+            dat = chantler_columns(te, tables, energy,
+                                   spline_cache=self.spline_cache,
+                                   label=elem, erange=erange, breaks=breaks)
+            number = self.composition[elem]
+            weight = density*number*AVOGADRO
+            delta += weight * (dat['f1'] + z)
+            beta_photo += weight * dat['f2']
+            beta_total += weight * dat['f2']*(dat['mu_total']/dat['mu_photo'])
+            total_mass += number * mass
+
+        scale = lamb_cm * lamb_cm * R_ELECTRON_CM / (2*pi * total_mass)
+        delta = delta * scale
+        beta = beta_total * scale
+        if photo_only:
+            beta = beta_photo * scale
+        return delta, beta, lamb_cm/(4*pi*beta)
+
+
+def _resolve(name, density, caller):
+    """(formula, density) for a material name or formula, raising
+    Warning if no density is given for an unknown material"""
+    mater = _registry.get(name)
+    if mater is None:
+        if density is None:
+            raise Warning('''%s():
+                must give density for unknown materials''' % caller)
+        return name, density
+    if density is None:
+        density = mater[1]
+    return mater[0], density
+
+
+def _mass_weighted_mu(masses, matrix, density):
+    """mu (1/cm) from the masses of the elements in a formula unit and
+    their mass attenuation coefficients, the rows of matrix.
+
+    summed element by element rather than with a BLAS product, whose
+    rounding depends on the array size: blocks of energies then give
+    the same values as all energies at once"""
+    mass_tot, mu = 0.0, 0.0
+    for mass, xsec in zip(masses, matrix):
+        mu += mass * xsec
+        mass_tot += mass
+    return density*mu/mass_tot
+
+
+def _weighted_mu(weights, matrix):
+    """sum of weights[..., i] * matrix[i, ...] over elements i: the
+    mass attenuation of compounds from the mass attenuation of their
+    elements"""
+    out = np.tensordot(weights, matrix, axes=1)
+    if out.ndim == 0:
+        return out[()]
+    return out
+
+
+def material_mu(name, energy, density=None, kind='total', xdb=None,
+                chunk_size=None, out=None, cache=None):
     """
     return X-ray attenuation length (in 1/cm) for a material by name or formula
 
@@ -34,6 +345,7 @@ def material_mu(name, energy, density=None, kind='total'):
                known material, that density will be used.
      kind:     'photo' or 'total' (default) for whether to
                return photo-absorption or total cross-section.
+     xdb:      xrayDB instance, the shared get_xraydb() instance if None
     returns
     -------
      mu, absorption length in 1/cm
@@ -42,32 +354,90 @@ def material_mu(name, energy, density=None, kind='total'):
     -----
       1.  material names are not case sensitive,
           chemical compounds are case sensitive.
-      2.  mu_elam() is used for mu calculation.
+      2.  Elam cross-sections (as for xrayDB.mu_elam()) are used, from
+          xrayDB.mu_elam_matrix(), which reads the tables once per xrayDB.
+      3.  use Material() to evaluate the same material many times.
+      4.  with chunk_size or out given, energies are evaluated in blocks
+          of chunk_size, and written to the array out.
+      5.  with cache, a ResultCache (see nist_lookup.result_cache), the
+          result is read from the cache when stored there.
 
     example
     -------
       >>> print material_mu('H2O', 1.0, 10000.0)
       5.32986401658495
     """
-    _materials = get_materials()
-    mater = _materials.get(name.lower(), None)
-    if mater is None:
-        formula = name
-        if density is None:
-            raise Warning('''material_mu():
-            must give density for unknown materials''')
-    else:
-        formula, density = mater
+    if xdb is None:
+        xdb = get_xraydb()
+    formula, density = _resolve(name, density, 'material_mu')
+    if cache is not None:
+        return cache.cached(
+            xdb, 'material_mu', (formula, density, energy, kind),
+            lambda: material_mu(formula, energy, density, kind, xdb,
+                                chunk_size, out), out=out)
+    composition = chemparse(formula)
+    elements = list(composition.keys())
+    masses = (np.array([composition[e] for e in elements], dtype=float) *
+              xdb.atomic_masses(elements))
 
-    mass_tot, mu = 0.0, 0.0
-    for elem, frac in chemparse(formula).items():
-        mass = frac * atomic_mass(elem)
-        mu += mass * mu_elam(elem, energy, kind=kind)
-        mass_tot += mass
-    return density*mu/mass_tot
+    def evaluate(energy):
+        return _mass_weighted_mu(masses, xdb.mu_elam_matrix(elements, energy,
+                                                            kind=kind),
+                                 density)
+    if chunk_size is None and out is None:
+        return evaluate(energy)
+    return chunked(evaluate, [energy], chunk_size=chunk_size, out=out)
+
+
+def material_mu_many(names, energy, densities=None, kind='total', xdb=None):
+    """X-ray attenuation (in 1/cm) for many materials at once
+
+    arguments
+    ---------
+     names:     list of material names or chemical formulas
+     energy:    energy or array of energies in eV
+     densities: list of densities (gr/cm^3), with None for the density of
+                a known material.  If None, all materials must be known.
+     kind:      'photo' or 'total' (default) for whether to
+                return photo-absorption or total cross-section.
+
+    returns
+    -------
+     mu, array of shape (len(names),) + energy.shape
+
+    the Elam cross-sections of all elements in the materials are evaluated
+    once, as a matrix, and mu of every material is the product of its
+    mass fractions with that matrix.
+    """
+    if xdb is None:
+        xdb = get_xraydb()
+    if densities is None:
+        densities = [None] * len(names)
+    if len(densities) != len(names):
+        raise ValueError("need one density per material")
+    elements, columns = [], {}
+    rows = []
+    for name, density in zip(names, densities):
+        formula, density = _resolve(name, density, 'material_mu_many')
+        row = {}
+        for elem, number in chemparse(formula).items():
+            if elem not in columns:
+                columns[elem] = len(elements)
+                elements.append(elem)
+            row[columns[elem]] = number * xdb.atomic_mass(elem)
+        rows.append((density, row))
+
+    weights = np.zeros((len(rows), len(elements)))
+    for i, (density, row) in enumerate(rows):
+        cols = list(row.keys())
+        masses = np.array([row[c] for c in cols])
+        weights[i, cols] = density * masses / masses.sum()
+    return _weighted_mu(weights, xdb.mu_elam_matrix(elements, energy,
+                                                    kind=kind))
 
 
-def material_mu_components(name, energy, density=None, kind='total'):
+def material_mu_components(name, energy, density=None, kind='total',
+                           xdb=None):
     """material_mu_components: absorption coefficient (in 1/cm) for a compound
 
     arguments
@@ -89,48 +459,59 @@ def material_mu_components(name, energy, density=None, kind='total'):
      {'Si': (1, 28.0855, 33.879432430185062), 'elements': ['Si', 'O'],
      'mass': 60.0843, 'O': (2.0, 15.9994, 5.9528248152970837), 'density': 2.65}
      """
-    _materials = get_materials()
-    mater = _materials.get(name.lower(), None)
-    if mater is None:
-        formula = name
-        if density is None:
-            raise Warning('''material_mu(): must give density for unknown
-                          materials''')
-    else:
-        formula, density = mater
-
+    if xdb is None:
+        xdb = get_xraydb()
+    formula, density = _resolve(name, density, 'material_mu_components')
+    composition = chemparse(formula)
+    elements = list(composition.keys())
+    matrix = xdb.mu_elam_matrix(elements, energy, kind=kind)
     out = {'mass': 0.0, 'density': density, 'elements': []}
-    for atom, frac in chemparse(formula).items():
-        mass = atomic_mass(atom)
-        mu = mu_elam(atom, energy, kind=kind)
-        out['mass'] += frac*mass
-        out[atom] = (frac, mass, mu)
-        out['elements'].append(atom)
+    for elem, mass, xsec in zip(elements, xdb.atomic_masses(elements),
+                                matrix):
+        number, mass = composition[elem], float(mass)
+        out['mass'] += number*mass
+        out[elem] = (number, mass, xsec)
+        out['elements'].append(elem)
     return out
 
 
 def material_get(name):
     """lookup material """
-    return get_materials().get(name.lower(), None)
+    return _registry.get(name)
 
 
 def material_add(name, formula, density):
-    """ save material in local db"""
-    materials = get_materials()
-    formula = formula.replace(' ', '')
-    materials[name.lower()] = (formula, float(density))
-
-    fname = 'materials.dat'
-    if os.path.exists(fname):
-        fh = open(fname, 'r')
-        text = fh.readlines()
-        fh.close()
-    else:
-        text = ['# user-specific database of materials\n',
-                '# name, formula, density\n']
-
-    text.append(" %s | %s | %g\n" % (name, formula, density))
-
-    fh = open(fname, 'w')
-    fh.write(''.join(text))
-    fh.close()
+    """ save material in user materials file (~/.nist_lookup/materials.dat,
+    or the last file given to set_materials_files())"""
+    _registry.add(name, formula, density)
+
+
+if __name__ == '__main__':
+    import time
+    from nist_lookup.xraydb import xrayDB
+    # the whole materials catalog on an energy grid
+    energies = np.linspace(1000, 100000, 2000)
+    names = sorted(get_materials())
+    for preload in (False, True):
+        xdb = xrayDB(preload=preload)
+        t0 = time.time()
+        first = [material_mu(name, energies, xdb=xdb) for name in names]
+        t1 = time.time()
+        mu = [material_mu(name, energies, xdb=xdb) for name in names]
+        t2 = time.time()
+        materials = [Material(name, xdb=xdb) for name in names]
+        t3 = time.time()
+        mu_mat = [mat.mu(energies) for mat in materials]
+        t4 = time.time()
+        mu_many = material_mu_many(names, energies, xdb=xdb)
+        t5 = time.time()
+        assert all(np.array_equal(a, b) for a, b in zip(mu, mu_mat))
+        assert np.allclose(mu_many, mu, rtol=1.e-12, atol=0)
+        print('preload=%s, %d materials x %d energies:' % (preload,
+                                                          len(names),
+                                                          len(energies)))
+        print('   material_mu, first pass   %.3f s' % (t1 - t0))
+        print('   material_mu               %.3f s' % (t2 - t1))
+        print('   Material(), then .mu()    %.3f s + %.3f s' % (t3 - t2,
+                                                                t4 - t3))
+        print('   material_mu_many          %.3f s' % (t5 - t4))
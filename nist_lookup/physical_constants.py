@@ -1,8 +1,10 @@
 # Useful physical constants
 # most of these are put into common X-ray units (Angstroms, ev)
+#
+# values are CODATA 2022, as in scipy.constants; they are written out
+# here so that importing them does not import scipy.
 
-import scipy.constants as consts
-from numpy import pi
+from math import pi
 
 RAD2DEG  = 180.0/pi
 DEG2RAD  = pi/180.0
@@ -10,18 +12,22 @@ DEG2RAD  = pi/180.0
 # cross-section unit
 BARN     = 1.e-24   # cm^2
 
-# atoms/mol =  6.0221413e23  atoms/mol
-AVOGADRO = consts.Avogadro
+# atoms/mol =  6.02214076e23  atoms/mol
+AVOGADRO = 6.02214076e+23
 
 # ATOMIC MASS in grams
-AMU = consts.atomic_mass * 1000.0
+AMU = 1.66053906892e-27 * 1000.0
 
 # Planck's Constant
 #   h*c    ~= 12398.42 eV*Ang
 #   hbar*c ~=  1973.27 eV*Ang
-PLANCK_HC    = 1.e10 * consts.Planck * consts.c / consts.e
+_PLANCK = 6.62607015e-34             # J s
+_SPEED_OF_LIGHT = 299792458.0        # m / s
+_ELEMENTARY_CHARGE = 1.602176634e-19  # C
+PLANCK_HC    = 1.e10 * _PLANCK * _SPEED_OF_LIGHT / _ELEMENTARY_CHARGE
 PLANCK_HBARC = PLANCK_HC / (2*pi)
 
 # classical electron radius in cm
-R_ELECTRON_CM  = 100.0 * consts.codata.physical_constants['classical electron radius'][0]
-R_ELECTRON_ANG = 1.e10 * consts.codata.physical_constants['classical electron radius'][0]
+_R_ELECTRON = 2.8179403205e-15       # m
+R_ELECTRON_CM  = 100.0 * _R_ELECTRON
+R_ELECTRON_ANG = 1.e10 * _R_ELECTRON
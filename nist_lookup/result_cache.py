@@ -0,0 +1,204 @@
+"""
+On-disk cache of material calculations, shared between processes.
+
+Results of xray_delta_beta() and material_mu() depend only on the
+formula, density, energies and options, and on the X-ray data.  With a
+ResultCache passed as cache=, they are stored as .npz files named by a
+SHA-256 hash of these inputs and of the checksum of the database file,
+so that a changed database gives new keys and old entries are never
+read again (they are evicted as the least recently used).
+
+    >>> from nist_lookup.result_cache import ResultCache
+    >>> cache = ResultCache('~/.cache/nist_lookup', maxsize=2**30)
+    >>> delta, beta, atlen = xray_delta_beta('SiO2', 2.2, energies,
+    ...                                      cache=cache)
+"""
+import os
+import time
+import hashlib
+import tempfile
+import threading
+import zipfile
+
+import numpy as np
+
+# bump when a change of the calculations changes cached results
+CACHE_VERSION = 1
+
+
+class ResultCache(object):
+    """directory of cached results, limited to maxsize bytes
+
+    entries are written to a temporary file and renamed into place, so
+    concurrent processes and threads only see complete files.  Reading an
+    entry updates its modification time.
+
+    the size of the directory is found by listing it once, and is then
+    kept up to date with the entries written by this instance (entries
+    written by other processes are seen at the next listing).  When it
+    grows beyond maxsize, the directory is listed again and the entries
+    that were least recently used are removed until it is below
+    low_water * maxsize.  Temporary files older than tmp_age seconds
+    are left from failed writes, and are removed first.
+    """
+    suffix = '.npz'
+    tmp_suffix = '.tmp'
+
+    def __init__(self, directory, maxsize=2**30, low_water=0.9,
+                 tmp_age=3600.0):
+        self.directory = os.path.abspath(os.path.expanduser(directory))
+        self.maxsize = maxsize
+        self.low_water = low_water
+        self.tmp_age = tmp_age
+        self._size = None
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, xdb, name, *args):
+        """hash of a calculation name and its arguments (strings, numbers,
+        None, tuples or arrays) for the data of xdb"""
+        sha = hashlib.sha256()
+        dense = xdb.dense
+        if dense is not None:
+            dense = (dense.emin, dense.emax, dense.step, dense.smoothing,
+                     dense.fit)
+        for arg in (CACHE_VERSION, xdb.checksum(), dense, name) + args:
+            if (isinstance(arg, (np.ndarray, np.number, list, int, float))
+                    and not isinstance(arg, bool)):
+                # numbers and arrays by value, whatever their type
+                arg = np.ascontiguousarray(arg, dtype=float)
+                sha.update(repr(arg.shape).encode('utf-8'))
+                sha.update(arg.tobytes())
+            else:
+                sha.update(repr(arg).encode('utf-8'))
+            sha.update(b'\x00')
+        return sha.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def get(self, key):
+        """return the result stored for key (an array or a tuple of
+        arrays), or None"""
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as dat:
+                count = int(dat['count'])
+                arrays = [dat['r%d' % i] for i in range(max(count, 1))]
+            os.utime(path)
+        except (OSError, KeyError, ValueError, EOFError,
+                zipfile.BadZipFile):
+            # missing, evicted, or not a complete or valid entry
+            return None
+        arrays = [a[()] if a.ndim == 0 else a for a in arrays]
+        if count < 0:
+            return arrays[0]
+        return tuple(arrays)
+
+    def put(self, key, result):
+        "store result (an array or a tuple of arrays) for key"
+        if isinstance(result, tuple):
+            arrays = dict(('r%d' % i, r) for i, r in enumerate(result))
+            count = len(result)
+        else:
+            arrays = {'r0': result}
+            count = -1
+        path = self._path(key)
+        fh = tempfile.NamedTemporaryFile(dir=self.directory, prefix=key,
+                                         suffix=self.tmp_suffix, delete=False)
+        try:
+            with fh:
+                np.savez(fh, count=count, **arrays)
+            size = os.path.getsize(fh.name)
+            try:
+                size -= os.path.getsize(path)
+            except OSError:
+                pass
+            os.replace(fh.name, path)
+        except BaseException:
+            try:
+                os.remove(fh.name)
+            except OSError:
+                pass
+            raise
+        with self._lock:
+            if self._size is not None:
+                self._size += size
+            full = self._size is None or self._size > self.maxsize
+        if full:
+            self.evict(self.maxsize, self.low_water * self.maxsize)
+
+    def _scan(self):
+        """list of (mtime, size, path) of the entries, oldest first,
+        and of the temporary files"""
+        entries, tmpfiles = [], []
+        for fname in os.listdir(self.directory):
+            if fname.endswith(self.suffix):
+                out = entries
+            elif fname.endswith(self.tmp_suffix):
+                out = tmpfiles
+            else:
+                continue
+            path = os.path.join(self.directory, fname)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            out.append((st.st_mtime_ns, st.st_size, path))
+        return sorted(entries), tmpfiles
+
+    def entries(self):
+        "list of (mtime, size, path) of the entries, oldest first"
+        return self._scan()[0]
+
+    def size(self):
+        "total size of the entries and temporary files in bytes"
+        entries, tmpfiles = self._scan()
+        return sum(e[1] for e in entries + tmpfiles)
+
+    def evict(self, maxsize=None, target=None):
+        """if the entries and temporary files take more than maxsize
+        bytes, remove stale temporary files, then the least recently used
+        entries until at most target (default maxsize) bytes are left"""
+        if maxsize is None:
+            maxsize = self.maxsize
+        if target is None:
+            target = maxsize
+        entries, tmpfiles = self._scan()
+        total = sum(e[1] for e in entries + tmpfiles)
+        if total > maxsize:
+            stale = time.time_ns() - int(self.tmp_age * 1e9)
+            remove = [t for t in tmpfiles if t[0] < stale] + entries
+            for mtime, size, path in remove:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                total -= size
+        with self._lock:
+            self._size = total
+
+    def clear(self):
+        "remove all entries"
+        self.evict(0)
+
+    def cached(self, xdb, name, args, func, out=None):
+        """func() for the calculation name with arguments args, from the
+        cache if stored, otherwise computed and stored.  If out (an array
+        or tuple of arrays, as for chunked()) is given, a stored result is
+        copied into it."""
+        key = self.key(xdb, name, *args)
+        result = self.get(key)
+        if result is None:
+            result = func()
+            self.put(key, result)
+        elif out is not None:
+            if isinstance(out, tuple):
+                for dest, res in zip(out, result):
+                    dest[...] = res
+            else:
+                out[...] = result
+            result = out
+        return result
@@ -9,11 +9,19 @@ Main Class for full Database:  xrayDB
 import os
 import time
 import json
+import hashlib
+import numbers
+import sqlite3
+import threading
+from collections import namedtuple, OrderedDict
+try:
+    from urllib.request import pathname2url
+except ImportError:
+    from urllib import pathname2url
 import numpy as np
-from scipy.interpolate import interp1d, splrep, splev, UnivariateSpline
 from sqlalchemy import MetaData, create_engine
-from sqlalchemy.orm import sessionmaker,  mapper, clear_mappers
-from sqlalchemy.pool import SingletonThreadPool
+from sqlalchemy.orm import sessionmaker, scoped_session, mapper
+from sqlalchemy.pool import NullPool
 
 # needed for py2exe?
 import sqlalchemy.dialects.sqlite
@@ -21,16 +29,32 @@ import sqlalchemy.dialects.sqlite
 
 def as_ndarray(obj):
     """make sure a float, int, list of floats or ints,
-    or tuple of floats or ints, acts as a numpy array
+    or tuple of floats or ints, acts as a numpy array.
+    scalars (including 0-d arrays) become 1-element arrays.
     """
     if isinstance(obj, (float, int)):
         return np.array([obj])
-    return np.asarray(obj)
+    obj = np.asarray(obj)
+    if obj.ndim == 0:
+        return obj.reshape(1)
+    return obj
 
 
-def make_engine(dbname):
-    return create_engine('sqlite:///%s' % (dbname),
-                         poolclass=SingletonThreadPool)
+def make_engine(dbname, read_only=False):
+    """create engine for sqlite file.
+
+    with read_only=True, connections are opened with mode=ro and
+    immutable=1, so that SQLite does no locking or change detection.
+    Connections are not pooled: each thread (session) opens its own.
+    """
+    if not read_only:
+        return create_engine('sqlite:///%s' % (dbname), poolclass=NullPool)
+    uri = 'file:%s?mode=ro&immutable=1' % pathname2url(
+        os.path.abspath(dbname))
+
+    def connect():
+        return sqlite3.connect(uri, uri=True)
+    return create_engine('sqlite://', creator=connect, poolclass=NullPool)
 
 
 def isxrayDB(dbname):
@@ -44,7 +68,7 @@ def isxrayDB(dbname):
                'elements', 'photoabsorption', 'scattering')
     result = False
     try:
-        engine = make_engine(dbname)
+        engine = make_engine(dbname, read_only=True)
         meta = MetaData(engine)
         meta.reflect()
         result = all([t in meta.tables for t in _tables])
@@ -63,17 +87,21 @@ def json_encode(val):
 def elam_spline(xin, yin, yspl_in, x):
     """ interpolate values from Elam photoabsorption and scattering tables,
     according to Elam, Numerical Recipes.  Calc borrowed from D. Dale.
+
+    xin must be sorted in increasing order; x may be a scalar or an
+    array of any shape, values outside of xin are clamped to its range.
     """
-    x = as_ndarray(x)
-    x[np.where(x < min(xin))] = min(xin)
-    x[np.where(x > max(xin))] = max(xin)
+    x = np.clip(as_ndarray(x), np.min(xin), np.max(xin))
 
-    lo, hi = np.array([(np.flatnonzero(xin < e)[-1],
-                        np.flatnonzero(xin > e)[0])
-                       for e in x]).transpose()
+    # lo: last tabulated point below x, hi: first tabulated point above x,
+    # found by binary search for all x at once.  Values clamped onto the
+    # end points of the table use the first / last interval.
+    nx = len(xin)
+    lo = np.clip(np.searchsorted(xin, x, side='left') - 1, 0, nx - 2)
+    hi = np.clip(np.searchsorted(xin, x, side='right'), 1, nx - 1)
 
     diff = xin[hi] - xin[lo]
-    if any(diff <= 0):
+    if np.any(diff <= 0):
         raise ValueError('x must be strictly increasing')
     a = (xin[hi] - x) / diff
     b = (x - xin[lo]) / diff
@@ -82,6 +110,362 @@ def elam_spline(xin, yin, yspl_in, x):
                              (b*b - 1) * b * yspl_in[hi]))
 
 
+# number of energies evaluated at a time by chunked()
+CHUNK_SIZE = 65536
+
+
+def iter_chunks(func, inputs, chunk_size=None):
+    """evaluate func over blocks of at most chunk_size values.
+
+    inputs is a list of arrays, broadcast against each other.  For each
+    block, func is called with a flat copy of the block of each input,
+    and (slice, result) is yielded, where slice selects the block
+    in the flattened broadcast shape.  Full-size temporaries of the
+    inputs are never made.
+    """
+    arrays = np.broadcast_arrays(*[np.asarray(a, dtype=float)
+                                   for a in inputs])
+    if chunk_size is None:
+        chunk_size = CHUNK_SIZE
+    size = arrays[0].size
+    for start in range(0, size, chunk_size):
+        block = slice(start, min(start + chunk_size, size))
+        yield block, func(*[a.flat[block] for a in arrays])
+
+
+def chunked(func, inputs, chunk_size=None, out=None):
+    """evaluate func over blocks of at most chunk_size values of the
+    broadcast inputs (see iter_chunks), writing the results to out.
+
+    func may return an array, a tuple of arrays or a dictionary of
+    arrays, and out must then be an array, a tuple or a dictionary of
+    arrays with the broadcast shape of inputs.  If out is None, it is
+    allocated.  Returns out.
+    """
+    shape = np.broadcast_shapes(*[np.shape(a) for a in inputs])
+
+    def empty():
+        return np.empty(shape)
+
+    def check(arr):
+        if np.shape(arr) != shape:
+            raise ValueError("out has shape %s, need %s"
+                             % (np.shape(arr), shape))
+        return arr
+
+    for block, result in iter_chunks(func, inputs, chunk_size=chunk_size):
+        if isinstance(result, dict):
+            if out is None:
+                out = dict((key, empty()) for key in result)
+            for key, val in result.items():
+                check(out[key]).flat[block] = val
+        elif isinstance(result, tuple):
+            if out is None:
+                out = tuple(empty() for val in result)
+            for arr, val in zip(out, result):
+                check(arr).flat[block] = val
+        else:
+            if out is None:
+                out = empty()
+            check(out).flat[block] = result
+    if out is None:
+        out = empty()
+    return out
+
+
+# Chantler columns interpolated separately on each side of an edge;
+# mu_incoh has no edges
+CHANTLER_EDGE_COLUMNS = ('f2', 'mu_photo', 'mu_total')
+
+
+def chantler_edge_breaks(te, f2, edges):
+    """energies at which interpolation of Chantler data is split, so
+    that it never straddles an absorption edge.
+
+    arguments
+    ---------
+    te:      tabulated energies of an element
+    f2:      tabulated f2 of the element
+    edges:   absorption edge energies (eV), as from xray_edges()
+
+    the step of an edge in the table is the table interval containing
+    the edge, or one of its two neighbours, where f2 rises most.  The
+    tabulated level energies are often a table point away from the step.
+    If the step contains the edge, the break is the edge energy,
+    otherwise it is at the table point between the edge and the step, so
+    that the whole step interval lies on its side of the edge.  Edges
+    with no rise of f2 next to them give no break, and an interval is
+    never split twice: the edge nearest to it is kept.  Returns a sorted
+    array.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rise = np.diff(np.log(f2))
+    rise[~np.isfinite(rise)] = 0
+    steps = {}
+    for edge in edges:
+        if not te[0] < edge < te[-1]:
+            continue
+        k = np.searchsorted(te, edge, side='right') - 1
+        near = [i for i in (k, k + 1, k - 1) if 0 <= i < len(rise)]
+        step = max(near, key=lambda i: rise[i])
+        if rise[step] <= 0:
+            continue
+        # distance of the edge from the step, in table points
+        dist = abs(step - k)
+        if step not in steps or dist < steps[step][0]:
+            # kept strictly inside the interval, so that it is split
+            steps[step] = (dist, min(max(edge, te[step]*(1 + 1.e-9)),
+                                     te[step+1]*(1 - 1.e-9)))
+    return np.sort([brk for dist, brk in steps.values()])
+
+
+def chantler_window(te, erange):
+    """(nemin, nemax), the window of table energies te used for energies
+    in erange = (emin, emax)"""
+    emin, emax = erange
+    # the window is found by binary search of the sorted table
+    nemin = max(0, -6 + np.searchsorted(te, emin, side='right'))
+    nemax = min(len(te), 5 + np.searchsorted(te, emax, side='right'))
+    return nemin, nemax
+
+
+def chantler_f1_spline(te, f1, window, smoothing=1, fit='window',
+                       spline_cache=None, label=None):
+    """spline representation (tck) of Chantler f1 for a table window,
+    fitted to the window (fit='window') or to the whole table ('full')"""
+    # scipy is only needed (and imported) for f1
+    from scipy.interpolate import UnivariateSpline
+    if fit == 'full':
+        fmin, fmax = 0, len(te)
+    else:
+        fmin, fmax = window
+    key = (label, float(smoothing), int(fmin), int(fmax))
+    tck = None
+    if spline_cache is not None:
+        tck = spline_cache.get(key)
+    if tck is None:
+        # the same spline as UnivariateSpline(...)(energy) gives with splev:
+        # get_knots() has the end knots once, splev needs them k+1 times
+        spline = UnivariateSpline(te[fmin:fmax], f1[fmin:fmax], s=smoothing)
+        knots = spline.get_knots()
+        tck = (np.concatenate(([knots[0]]*3, knots, [knots[-1]]*3)),
+               spline.get_coeffs(), 3)
+        if spline_cache is not None:
+            spline_cache.put(key, tck)
+    return tck
+
+
+def chantler_columns(te, tables, energy, smoothing=1, fit='window',
+                     spline_cache=None, label=None, erange=None,
+                     breaks=None):
+    """interpolate Chantler table columns at energies (in eV)
+
+    arguments
+    ---------
+    te:           tabulated energies of an element
+    tables:       dictionary of column name -> tabulated values
+    energy:       energy or array of energies in eV
+    smoothing:    smoothing of the f1 spline
+    fit:          'window' or 'full', table range for the f1 spline
+    spline_cache: SplineCache for f1 splines, keyed with label
+    erange:       (emin, emax) used to choose the table window
+                  (default: the range of energy).  Blocks of a larger
+                  energy array give the same results as the whole array
+                  when they are given its range.
+    breaks:       edge energies (eV) from chantler_edge_breaks(): the
+                  columns in CHANTLER_EDGE_COLUMNS are interpolated only
+                  between table points on the same side of an edge.
+
+    returns a dictionary with the same keys as tables.
+    """
+    energy = as_ndarray(energy)
+    if erange is None:
+        erange = (energy.min(), energy.max())
+    window = chantler_window(te, erange)
+    region = slice(*window)
+    if breaks is not None:
+        breaks = np.log(breaks)
+
+    # interpolation weights, split at the edges or not
+    weights = {}
+    out = {}
+    for column, ty in tables.items():
+        if column == 'f1':
+            from scipy.interpolate import splev
+            val = splev(energy, chantler_f1_spline(
+                te, ty, window, smoothing=smoothing, fit=fit,
+                spline_cache=spline_cache, label=label))
+        else:
+            split = breaks is not None and column in CHANTLER_EDGE_COLUMNS
+            if split not in weights:
+                weights[split] = InterpIndex(
+                    np.log(energy), np.log(te[region]),
+                    breaks=breaks if split else None)
+            val = np.exp(weights[split](np.log(ty[region])))
+        if isinstance(val, np.ndarray) and val.shape == (1,):
+            val = val[0]
+        out[column] = val
+    return out
+
+
+def elam_cross_section(tab_lne, tab_val, tab_spl, energies):
+    """evaluate Elam cross-section tables at energies (in eV)
+
+    arguments
+    ---------
+    tab_lne:   tabulated log(energy)
+    tab_val:   tabulated log(cross-section)
+    tab_spl:   spline coefficients for tab_val
+    energies:  energy or array of energies in eV
+    """
+    energies = 1.0 * as_ndarray(energies)
+    emin_tab = 10*int(0.102*np.exp(tab_lne[0]))
+    energies[np.where(energies < emin_tab)] = emin_tab
+    out = np.exp(elam_spline(tab_lne, tab_val, tab_spl, np.log(energies)))
+    if out.shape == (1,):
+        return out[0]
+    return out
+
+
+class ElamTables(object):
+    """Elam tables of several elements, packed end to end so that their
+    cross-sections can be evaluated together.
+
+    tables is a list of (log_energy, log_value, log_value_spline) arrays,
+    one per element (row), as from xrayDB._getElamArrays().  evaluate()
+    gives the same values as elam_cross_section() for each row.
+    """
+    def __init__(self, tables):
+        sizes = [len(t[0]) for t in tables]
+        self.offsets = np.cumsum([0] + sizes[:-1]).astype(int)
+        self.sizes = np.array(sizes, dtype=int)
+        self.lne = np.concatenate([t[0] for t in tables])
+        self.val = np.concatenate([t[1] for t in tables])
+        self.spl = np.concatenate([t[2] for t in tables])
+        # lowest energy of each table, as used by elam_cross_section()
+        self.log_emin = np.log(np.array(
+            [10*int(0.102*np.exp(t[0][0])) for t in tables], dtype=float))
+        self.log_xmin = np.array([np.min(t[0]) for t in tables])
+        self.log_xmax = np.array([np.max(t[0]) for t in tables])
+
+    # number of values evaluated together by evaluate()
+    block_size = 16384
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def evaluate(self, energies, rows=None):
+        """cross-sections at energies (in eV) for rows (default: all),
+        as an array of shape (len(rows),) + energies.shape"""
+        if rows is None:
+            rows = np.arange(len(self.sizes))
+        rows = np.asarray(rows, dtype=int)
+        energies = np.asarray(energies, dtype=float)
+        with np.errstate(divide='ignore'):
+            loge = np.log(energies)
+        out = np.empty((len(rows),) + energies.shape)
+        # blocks of rows small enough for the temporaries to stay in cache
+        block = max(1, self.block_size // max(1, energies.size))
+        for i in range(0, len(rows), block):
+            out[i:i+block] = self._evaluate(loge, rows[i:i+block])
+        return out
+
+    def _evaluate(self, loge, rows):
+        "cross-sections at log(energies) for rows"
+        return self.spline(self.positions(loge, rows))
+
+    def positions(self, loge, rows):
+        """table positions and spline weights (lo, hi, a, b, w, wa, wb) of
+        log(energies) for rows, which can be used by spline() for all
+        ElamTables with the same table energies"""
+        shape = (len(rows),) + (1,) * loge.ndim
+        x = np.maximum(loge, self.log_emin[rows].reshape(shape))
+        x = np.clip(x, self.log_xmin[rows].reshape(shape),
+                    self.log_xmax[rows].reshape(shape))
+
+        # table positions, as in elam_spline(), searched table by table
+        lo = np.empty(x.shape, dtype=int)
+        hi = np.empty(x.shape, dtype=int)
+        for i, row in enumerate(rows):
+            off, size = self.offsets[row], self.sizes[row]
+            xin = self.lne[off:off+size]
+            lo[i] = off + np.clip(np.searchsorted(xin, x[i], side='left') - 1,
+                                  0, size - 2)
+            hi[i] = off + np.clip(np.searchsorted(xin, x[i], side='right'),
+                                  1, size - 1)
+
+        xlo, xhi = self.lne[lo], self.lne[hi]
+        diff = xhi - xlo
+        a = (xhi - x) / diff
+        b = (x - xlo) / diff
+        return lo, hi, a, b, diff*diff/6, (a*a - 1) * a, (b*b - 1) * b
+
+    def spline(self, positions):
+        "cross-sections at table positions from positions()"
+        lo, hi, a, b, w, wa, wb = positions
+        return np.exp(a * self.val[lo] + b * self.val[hi] +
+                      w * (wa * self.spl[lo] + wb * self.spl[hi]))
+
+
+class InterpIndex(object):
+    """positions of x in the increasing array xp, computed once so that
+    several value arrays fp can be interpolated at the same points.
+
+    InterpIndex(x, xp)(fp) gives the same result as np.interp(x, xp, fp)
+
+    with breaks, a sorted array of x values where fp may step, points
+    strictly inside an interval of xp that contains a break are instead
+    extrapolated from the neighbouring interval on their own side of
+    the break.
+    """
+    def __init__(self, x, xp, breaks=None):
+        x = np.asarray(x, dtype=float)
+        xp = np.asarray(xp, dtype=float)
+        nxp = len(xp)
+        j = np.searchsorted(xp, x, side='right') - 1
+        self.j = np.clip(j, 0, max(nxp - 2, 0))
+        if breaks is not None and nxp > 3:
+            self._split(x, xp, breaks)
+        jhi = np.minimum(self.j + 1, nxp - 1)
+        self.dxlo = x - xp[self.j]
+        self.dxhi = x - xp[jhi]
+        self.span = xp[jhi] - xp[self.j]
+        # points below, at or above the table ends, or exactly on a
+        # tabulated point, take a table value
+        below = x < xp[0]
+        above = x >= xp[-1]
+        self.jcopy = np.where(below, 0, np.where(above, nxp - 1, self.j))
+        self.copy = below | above | (x == xp[self.j])
+        self.isnan = np.isnan(x)
+        self.x = x
+
+    def _split(self, x, xp, breaks):
+        "move points in intervals containing a break to the next interval"
+        nxp = len(xp)
+        kbreak = np.searchsorted(xp, breaks, side='right') - 1
+        for k, xbreak in zip(kbreak, breaks):
+            if k < 1 or k > nxp - 3:
+                continue
+            inside = (x > xp[k]) & (x < xp[k+1])
+            if np.any(inside):
+                self.j = np.where(inside, np.where(x < xbreak, k - 1, k + 1),
+                                  self.j)
+
+    def __call__(self, fp):
+        fp = np.asarray(fp, dtype=float)
+        j, jhi = self.j, np.minimum(self.j + 1, len(fp) - 1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            slope = (fp[jhi] - fp[j]) / self.span
+            out = slope*self.dxlo + fp[j]
+            retry = np.isnan(out) & ~self.copy
+            if np.any(retry):
+                out = np.where(retry, slope*self.dxhi + fp[jhi], out)
+                same = retry & np.isnan(out) & (fp[j] == fp[jhi])
+                out = np.where(same, fp[j], out)
+        out = np.where(self.copy, fp[self.jcopy], out)
+        return np.where(self.isnan, self.x, out)
+
+
 class DBException(Exception):
     """DB Access Exception: General Errors"""
 
@@ -163,40 +547,933 @@ class ChantlerTable(_BaseTable):
      energy, f1, f2, mu_photo, mu_incoh, mu_total) = [None]*14
 
 
-class xrayDB(object):
-    "interface to Xray Data"
-    def __init__(self, dbname='xrayref.db', read_only=True):
-        "connect to an existing database"
-        if not os.path.exists(dbname):
-            parent, child = os.path.split(__file__)
-            dbname = os.path.join(parent, dbname)
-            if not os.path.exists(dbname):
-                raise IOError("Database '%s' not found!" % dbname)
+ElementData = namedtuple('ElementData',
+                         ('atomic_number', 'element', 'molar_mass', 'density'))
+CoreHoleData = namedtuple('CoreHoleData',
+                          ('atomic_number', 'element', 'edge', 'width'))
 
-        if not isxrayDB(dbname):
-            raise ValueError(
-                "'%s' is not a valid X-ray Database file!" % dbname)
+# file signature and version for TableStore.save_binary()
+BINARY_MAGIC = b'XRAYDB\x00\x00'
+BINARY_VERSION = 2
 
-        self.dbname = dbname
-        self.engine = make_engine(dbname)
-        self.conn = self.engine.connect()
-        kwargs = {}
-        if read_only:
-            kwargs = {'autoflush': True, 'autocommit': False}
 
-            def readonly_flush(*args, **kwargs):
-                return
-            self.session = sessionmaker(bind=self.engine, **kwargs)()
-            self.session.flush = readonly_flush
+def _sha256(filename):
+    "SHA-256 hex digest of a file"
+    sha = hashlib.sha256()
+    with open(filename, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _json_array(val):
+    "decode a JSON text column to a numpy array"
+    return np.array(json.loads(val))
+
+
+class TableStore(object):
+    """in-memory copy of all xrayDB tables
+
+    every table is read once, JSON columns are decoded to numpy arrays,
+    and rows are keyed by element symbol (or ion / level names), so that
+    the xrayDB accessors can be served without going through SQLAlchemy.
+
+    the store can be saved to a binary file with save_binary() and read
+    back, memory-mapped, with TableStore.load_binary().
+    """
+    def __init__(self, xdb=None):
+        if xdb is None:
+            return
+        query = xdb.query
+
+        self.elements = {}
+        for r in query(ElementsTable).all():
+            row = ElementData(r.atomic_number, r.element,
+                              r.molar_mass, r.density)
+            self.elements.setdefault(str(r.element), row)
+
+        self.chantler = {}
+        self.chantler_ids = {}
+        for r in query(ChantlerTable).all():
+            self.chantler_ids.setdefault(int(r.id), str(r.element))
+            self.chantler.setdefault(str(r.element), dict(
+                (col, _json_array(getattr(r, col)))
+                for col in ('energy', 'f1', 'f2', 'mu_photo',
+                            'mu_incoh', 'mu_total')))
+
+        self.elam = {}
+        for r in query(PhotoAbsorptionTable).all():
+            self.elam.setdefault(('photo', str(r.element)), (
+                _json_array(r.log_energy),
+                _json_array(r.log_photoabsorption),
+                _json_array(r.log_photoabsorption_spline)))
+        for r in query(ScatteringTable).all():
+            lne = _json_array(r.log_energy)
+            self.elam.setdefault(('coh', str(r.element)), (
+                lne,
+                _json_array(r.log_coherent_scatter),
+                _json_array(r.log_coherent_scatter_spline)))
+            self.elam.setdefault(('incoh', str(r.element)), (
+                lne,
+                _json_array(r.log_incoherent_scatter),
+                _json_array(r.log_incoherent_scatter_spline)))
+
+        self.waasmaier = {}
+        for r in query(WaasmaierTable).all():
+            coefs = (r.offset, json.loads(r.scale), json.loads(r.exponents))
+            self.waasmaier.setdefault(str(r.ion), coefs)
+        self.ions = [(int(r.atomic_number), str(r.element), str(r.ion))
+                     for r in query(WaasmaierTable).all()]
+
+        self.levels = {}
+        for r in query(XrayLevelsTable).all():
+            edges = self.levels.setdefault(str(r.element), {})
+            edges[str(r.iupac_symbol)] = (r.absorption_edge,
+                                          r.fluorescence_yield,
+                                          r.jump_ratio)
+
+        self.transitions = {}
+        for r in query(XrayTransitionsTable).all():
+            self.transitions.setdefault(str(r.element), []).append(
+                (str(r.siegbahn_symbol), r.emission_energy, r.intensity,
+                 r.initial_level, r.final_level))
+
+        self.coster_kronig = {}
+        for r in query(CosterKronigTable).all():
+            key = (r.element, r.initial_level, r.final_level)
+            self.coster_kronig.setdefault(
+                key, (r.transition_probability,
+                      r.total_transition_probability))
+
+        self.corehole = [CoreHoleData(r.atomic_number, r.element,
+                                      r.edge, r.width)
+                         for r in query(KeskiRahkonenKrauseTable).all()]
+
+    def save_binary(self, filename, source=None, source_checksum=None):
+        """write the store to a flat binary file that can be memory-mapped.
+
+        the file starts with BINARY_MAGIC, the length of a JSON header
+        (little-endian uint64) and the header itself, which holds the
+        small tables and the (offset, length) of every array.  The arrays
+        follow as float64, starting at a multiple of 64 bytes.
+
+        source and source_checksum, the name and SHA-256 digest of the
+        database the store was read from, are kept in the header, so that
+        load_binary() can reject a file made from another database.
+        """
+        arrays, index = [], {}
+
+        def add(name, arr):
+            arr = np.ascontiguousarray(arr, dtype='<f8')
+            index[name] = (sum(len(a) for a in arrays), len(arr))
+            arrays.append(arr)
+
+        for elem, cols in self.chantler.items():
+            for col, arr in cols.items():
+                add('chantler/%s/%s' % (elem, col), arr)
+        for (kind, elem), tabs in self.elam.items():
+            for name, arr in zip(('lne', 'val', 'spl'), tabs):
+                add('elam/%s/%s/%s' % (kind, elem, name), arr)
+
+        header = {
+            'version': BINARY_VERSION,
+            'source': source,
+            'source_checksum': source_checksum,
+            'arrays': index,
+            'elements': [list(r) for r in self.elements.values()],
+            'chantler_ids': sorted(self.chantler_ids.items()),
+            'waasmaier': [[ion] + list(c)
+                          for ion, c in self.waasmaier.items()],
+            'ions': self.ions,
+            'levels': self.levels,
+            'transitions': self.transitions,
+            'coster_kronig': [list(k) + list(v)
+                              for k, v in self.coster_kronig.items()],
+            'corehole': [list(r) for r in self.corehole]}
+        header = json.dumps(header).encode('utf-8')
+        start = len(BINARY_MAGIC) + 8 + len(header)
+        header += b' ' * (-start % 64)
+
+        tmpname = '%s.%d.tmp' % (filename, os.getpid())
+        with open(tmpname, 'wb') as fh:
+            fh.write(BINARY_MAGIC)
+            fh.write(np.array(len(header), dtype='<u8').tobytes())
+            fh.write(header)
+            for arr in arrays:
+                fh.write(arr.tobytes())
+        os.replace(tmpname, filename)
+
+    @classmethod
+    def load_binary(cls, filename, source_checksum=None):
+        """return TableStore for a file written by save_binary().
+
+        the arrays are read-only views into one np.memmap of the file, so
+        processes opening the same file share its pages.  If
+        source_checksum is given, it must be the checksum of the database
+        the file was made from, otherwise ValueError is raised.
+        """
+        with open(filename, 'rb') as fh:
+            magic = fh.read(len(BINARY_MAGIC))
+            if magic != BINARY_MAGIC:
+                raise ValueError("'%s' is not a binary xrayDB file"
+                                 % filename)
+            hlen = int(np.frombuffer(fh.read(8), dtype='<u8')[0])
+            header = json.loads(fh.read(hlen).decode('utf-8'))
+        if header['version'] != BINARY_VERSION:
+            raise ValueError("'%s' has unsupported version %s, "
+                             "remake it with make_binary_db()"
+                             % (filename, header['version']))
+        if (source_checksum is not None and
+                header['source_checksum'] != source_checksum):
+            raise ValueError("'%s' was made from a different database than "
+                             "'%s', remake it with make_binary_db()"
+                             % (filename, header['source']))
+        data = np.memmap(filename, dtype='<f8', mode='r',
+                         offset=len(BINARY_MAGIC) + 8 + hlen)
+
+        def array(name):
+            offset, length = header['arrays'][name]
+            return data[offset:offset+length].view(np.ndarray)
+
+        self = cls()
+        self.source = header['source']
+        self.elements = {}
+        for row in header['elements']:
+            row = ElementData(*row)
+            self.elements[row.element] = row
+        self.chantler_ids = dict(header['chantler_ids'])
+        self.chantler, self.elam = {}, {}
+        for name in header['arrays']:
+            parts = name.split('/')
+            if parts[0] == 'chantler':
+                cols = self.chantler.setdefault(parts[1], {})
+                cols[parts[2]] = array(name)
+            elif parts[0] == 'elam' and parts[3] == 'lne':
+                prefix = '/'.join(parts[:3])
+                self.elam[(parts[1], parts[2])] = tuple(
+                    array('%s/%s' % (prefix, n))
+                    for n in ('lne', 'val', 'spl'))
+        self.waasmaier = dict((r[0], tuple(r[1:]))
+                              for r in header['waasmaier'])
+        self.ions = [tuple(r) for r in header['ions']]
+        self.levels = dict(
+            (elem, dict((edge, tuple(v)) for edge, v in edges.items()))
+            for elem, edges in header['levels'].items())
+        self.transitions = dict(
+            (elem, [tuple(r) for r in rows])
+            for elem, rows in header['transitions'].items())
+        self.coster_kronig = dict((tuple(r[:3]), tuple(r[3:]))
+                                  for r in header['coster_kronig'])
+        self.corehole = [CoreHoleData(*r) for r in header['corehole']]
+        return self
+
+
+def make_binary_db(dbname='xrayref.db', filename=None):
+    """convert an X-ray database file into the binary format
+    read by xrayDB(binary=...).  The default output file has the same
+    name as the database with extension '.bin'.  Returns the file name.
+    """
+    xdb = xrayDB(dbname)
+    if filename is None:
+        filename = os.path.splitext(xdb.dbname)[0] + '.bin'
+    TableStore(xdb).save_binary(filename,
+                                source=os.path.basename(xdb.dbname),
+                                source_checksum=xdb.checksum())
+    xdb.close()
+    return filename
+
+
+class SplineCache(object):
+    """bounded LRU cache of spline representations (knots, coefs, degree)
+
+    keys are tuples of (element, smoothing, nemin, nemax), where
+    nemin:nemax is the slice of the tabulated data that was fitted.
+    If filename is given and exists, the cache is read from it;
+    save() writes the cache to a .npz file.
+    """
+    def __init__(self, maxsize=256, filename=None):
+        self.maxsize = maxsize
+        self.filename = filename
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        if filename is not None and os.path.exists(filename):
+            self.load(filename)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key):
+        "return (t, c, k) for key, or None"
+        with self._lock:
+            tck = self._data.get(key, None)
+            if tck is not None:
+                self._data.move_to_end(key)
+            return tck
+
+    def put(self, key, tck):
+        "store (t, c, k) for key, evicting the least recently used entries"
+        with self._lock:
+            self._data[key] = tck
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def save(self, filename=None):
+        "write cache to a .npz file"
+        if filename is None:
+            filename = self.filename
+        if filename is None:
+            raise ValueError("no filename given for SplineCache.save()")
+        with self._lock:
+            entries = list(self._data.items())
+        arrays = {'keys': np.array(['|'.join(str(k) for k in key)
+                                    for key, tck in entries]),
+                  'degrees': np.array([tck[2] for key, tck in entries],
+                                      dtype=int)}
+        for i, (key, (t, c, k)) in enumerate(entries):
+            arrays['t%d' % i] = t
+            arrays['c%d' % i] = c
+        tmpname = '%s.%d.tmp' % (filename, os.getpid())
+        with open(tmpname, 'wb') as fh:
+            np.savez(fh, **arrays)
+        os.replace(tmpname, filename)
+
+    def load(self, filename):
+        "read cache entries from a .npz file written by save()"
+        with np.load(filename, allow_pickle=False) as dat:
+            for i, skey in enumerate(dat['keys']):
+                element, smoothing, nemin, nemax = skey.split('|')
+                if element.isdigit():
+                    element = int(element)
+                key = (element, float(smoothing), int(nemin), int(nemax))
+                self.put(key, (dat['t%d' % i], dat['c%d' % i],
+                               int(dat['degrees'][i])))
+
+
+def _elam_kind(kind):
+    "normalize kind of Elam cross-section to 'photo', 'coh' or 'incoh'"
+    kind = kind.lower()
+    if kind.startswith('coh'):
+        return 'coh'
+    elif kind.startswith('incoh'):
+        return 'incoh'
+    return 'photo'
+
+
+class DenseGrid(object):
+    """Chantler and Elam data of elements resampled onto a dense,
+    log-uniform energy grid between emin and emax (in eV).
+
+    the grid of each element is split at its absorption edges, so that
+    no grid interval spans an edge: at the energies from xray_edges(), at
+    the Chantler and Elam table energies within edge_window (relative) of
+    them, where the data has its steps and near-edge structure, at the
+    edges as located by chantler_breaks(), and at the edges tabulated by
+    Elam.  Evaluation is a binary search over these
+    breakpoints, a constant-time index computation and linear
+    interpolation in log(energy) -- of f1, and of log(value) for the
+    other Chantler columns and the Elam cross-sections.
+
+    after building, est_error[(element, name)] holds an estimate of the
+    maximum relative error against the exact calculation.  It is the
+    largest error found midway between grid points, where the errors of
+    linear interpolation are largest, and on each side of the Chantler and
+    Elam table energies, where the curvature changes.  It is a sampled
+    estimate, not a bound: the true maximum can be a few percent larger.
+    name is a Chantler column or 'elam_photo', 'elam_coh', 'elam_incoh'.
+    As f1 crosses zero, its error is given relative to the atomic number Z.
+
+    with fit='window', f1 changes with the table window its spline is
+    fitted to.  Both the grid values and the reference for est_error then
+    use the spline of the window around each energy's own table interval,
+    which is what f1_chantler() gives for energies within one interval;
+    f1_chantler() on a wide energy array fits a wider window and can
+    differ from this by more than est_error.
+    """
+    chantler_columns = ('f1', 'f2', 'mu_photo', 'mu_incoh', 'mu_total')
+    elam_kinds = ('photo', 'coh', 'incoh')
+    edge_window = 0.05
+
+    def __init__(self, xdb, emin=1000.0, emax=100000.0, points_per_decade=1000,
+                 elements=None, smoothing=1, fit='window'):
+        if not 0 < emin < emax:
+            raise ValueError("DenseGrid needs 0 < emin < emax")
+        self.emin, self.emax = float(emin), float(emax)
+        self.step = np.log(10.0) / points_per_decade
+        self.smoothing, self.fit = smoothing, fit
+        if elements is None:
+            elements = [sym for sym in xdb.element_symbols[1:]
+                        if xdb._getChantlerArrays(sym, ('energy',))
+                        is not None]
+        self.grids = {}
+        self.est_error = {}
+        for elem in elements:
+            self._add_element(xdb, xdb.symbol(elem))
+
+    def _nodes(self, breaks):
+        """log-energy nodes for segments between breakpoints.
+        returns (starts, widths, offsets, nodes, samples), where samples
+        are the nodes moved just inside their segment"""
+        lo, hi = np.log(self.emin), np.log(self.emax)
+        bounds = [lo] + [b for b in breaks if lo < b < hi] + [hi]
+        starts, widths, offsets, nodes, samples = [], [], [], [], []
+        nnodes = 0
+        for a, b in zip(bounds[:-1], bounds[1:]):
+            n = max(1, int(np.ceil((b - a) / self.step)))
+            x = np.linspace(a, b, n + 1)
+            starts.append(a)
+            widths.append((b - a) / n)
+            offsets.append(nnodes)
+            nnodes += n + 1
+            nodes.append(x)
+            # sample each side of an edge on its own side
+            xs = x.copy()
+            shift = min(1.e-9, (b - a) / 4)
+            xs[0] += shift
+            xs[-1] -= shift
+            samples.append(xs)
+        return (np.array(bounds[1:-1]), np.array(starts), np.array(widths),
+                np.array(offsets), np.concatenate(nodes),
+                np.concatenate(samples))
+
+    def _add_element(self, xdb, elem):
+        "sample the exact data of an element onto its grid"
+        edges = np.array([e[0] for e in xdb.xray_edges(elem).values()
+                          if e[0] > 0])
+        breaks = list(np.log(edges))
+
+        def near_edges(te):
+            "log of table energies within edge_window of an edge"
+            if len(edges) == 0:
+                return []
+            near = np.abs(te[:, None]/edges[None, :] - 1) < self.edge_window
+            return list(np.log(te[near.any(axis=1)]))
+
+        arrays = xdb._getChantlerArrays(elem, ('energy',))
+        table_energies = []
+        if arrays is not None:
+            table_energies = arrays[0]
+            breaks.extend(near_edges(arrays[0]))
+            breaks.extend(np.log(xdb.chantler_breaks(elem)))
+        elam = {}
+        for kind in self.elam_kinds:
+            arrays = xdb._getElamArrays(elem, kind)
+            if arrays is not None:
+                elam[kind] = arrays
+                lne = arrays[0]
+                breaks.extend(lne[1:][np.diff(lne) <= 0])
+                breaks.extend(near_edges(np.exp(lne)))
+        breaks = sorted(set(breaks))
+        bks, starts, widths, offsets, nodes, samples = self._nodes(breaks)
+        counts = np.diff(np.append(offsets, len(nodes))) - 1
+        grid = {'breaks': bks, 'starts': starts, 'widths': widths,
+                'offsets': offsets, 'counts': counts, 'values': {}}
+        self.grids[elem] = grid
+
+        # exact values at the nodes and midway between them
+        energies = np.exp(samples)
+        mids = np.exp(0.5*(nodes[:-1] + nodes[1:]))
+        mids = mids[np.diff(nodes) > 0]
+        # and each side of the Chantler table energies, where the window
+        # of the f1 spline changes, and of the Elam table energies, where
+        # the curvature of the cross-section splines changes
+        te = np.concatenate([np.asarray(table_energies, dtype=float)] +
+                            [np.exp(arrays[0]) for arrays in elam.values()])
+        te = te[(te > self.emin) & (te < self.emax)]
+        mids = np.concatenate((mids, te*(1 - 1.e-9), te*(1 + 1.e-9)))
+        exact, ref = {}, {}
+        chantler = xdb._getChantlerColumns(elem, np.append(energies, mids),
+                                           self.chantler_columns,
+                                           smoothing=self.smoothing,
+                                           fit=self.fit)
+        if chantler is not None:
+            if self.fit == 'window':
+                chantler['f1'] = self._windowed_f1(
+                    xdb, elem, np.append(energies, mids))
+            for col, val in chantler.items():
+                exact[col] = val[:len(energies)]
+                ref[col] = val[len(energies):]
+        for kind, arrays in elam.items():
+            val = elam_cross_section(arrays[0], arrays[1], arrays[2],
+                                     np.append(energies, mids))
+            exact['elam_' + kind] = val[:len(energies)]
+            ref['elam_' + kind] = val[len(energies):]
+
+        z = xdb.atomic_number(elem)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for name, val in exact.items():
+                if name != 'f1':
+                    val = np.log(val)
+                grid['values'][name] = val
+                approx = self._eval(grid, name, mids)
+                if name == 'f1':
+                    err = np.abs(approx - ref[name]) / z
+                else:
+                    err = np.abs(approx / ref[name] - 1)
+                err = err[np.isfinite(err)]
+                self.est_error[(elem, name)] = err.max() if len(err) else 0.0
+
+    def _windowed_f1(self, xdb, elem, energy):
+        """f1 at energies, each from the spline fitted to the table window
+        around its table interval, as f1_chantler() gives for energies
+        within one interval"""
+        te = xdb._getChantlerArrays(elem, ('energy',))[0]
+        interval = np.searchsorted(te, energy, side='right')
+        out = np.empty(len(energy))
+        for k in np.unique(interval):
+            sel = interval == k
+            out[sel] = xdb._getChantlerColumns(elem, energy[sel], ('f1',),
+                                               smoothing=self.smoothing,
+                                               fit=self.fit)['f1']
+        return out
+
+    def _eval(self, grid, name, energy):
+        "interpolate values of name at energies (in eV)"
+        loge = np.log(energy)
+        seg = np.searchsorted(grid['breaks'], loge, side='right')
+        pos = (loge - grid['starts'][seg]) / grid['widths'][seg]
+        i = np.clip(pos.astype(int), 0, grid['counts'][seg] - 1)
+        j = grid['offsets'][seg] + i
+        vals = grid['values'][name]
+        out = vals[j] + (pos - i) * (vals[j + 1] - vals[j])
+        if name != 'f1':
+            out = np.exp(out)
+        return out
+
+    def covers(self, element, energy):
+        "whether element is on the grid and all energies are in its range"
+        return (element in self.grids and energy.min() >= self.emin and
+                energy.max() <= self.emax)
+
+    def chantler(self, element, energy, columns):
+        """dictionary of Chantler columns at energies (in eV), or None if
+        the element or energies are not on the grid"""
+        energy = as_ndarray(energy)
+        if not self.covers(element, energy):
+            return None
+        out = {}
+        for col in columns:
+            if col not in self.grids[element]['values']:
+                return None
+            val = self._eval(self.grids[element], col, energy)
+            if val.shape == (1,):
+                val = val[0]
+            out[col] = val
+        return out
+
+    def elam(self, element, energy, kind='photo'):
+        """Elam cross-section ('photo', 'coh' or 'incoh') at energies
+        (in eV), or None if the element or energies are not on the grid"""
+        energy = as_ndarray(energy)
+        name = 'elam_' + _elam_kind(kind)
+        if (not self.covers(element, energy) or
+                name not in self.grids[element]['values']):
+            return None
+        out = self._eval(self.grids[element], name, energy)
+        if out.shape == (1,):
+            return out[0]
+        return out
+
+    def error_report(self):
+        "text table of the estimated maximum relative errors, one per element"
+        names = list(self.chantler_columns) + ['elam_' + kind for kind
+                                               in self.elam_kinds]
+        lines = ['%-3s ' % 'el' + ' '.join('%10s' % n for n in names)]
+        for elem in self.grids:
+            lines.append('%-3s ' % elem + ' '.join(
+                '%10.2e' % self.est_error.get((elem, n), np.nan)
+                for n in names))
+        return '\n'.join(lines)
+
+
+class LineIndex(object):
+    """absorption edges and emission lines of all elements, read once and
+    aggregated, so that xray_line() and fluo_yield() are dictionary lookups.
+
+    for each element symbol:
+      edges[elem]:    {edge: (energy, fluorescence_yield, jump_ratio)}
+      lines[elem]:    {siegbahn: (energy, intensity, initial, final)}
+      families[elem]: {family: (energy, intensity, initial, final)} for the
+                      families 'ka', 'kb', 'la', 'lb', 'lg': intensity
+                      weighted energy and net intensity of the lines whose
+                      (lowercase) name starts with family
+      emission[elem]: {(edge, prefix): (energy, probability)}, for lines
+                      from initial level edge whose name starts with prefix,
+                      for every prefix of these names, as used by fluo_yield()
+    """
+    family_names = ('ka', 'kb', 'la', 'lb', 'lg')
+
+    def __init__(self, xdb):
+        self.symbols = xdb.element_symbols
+        if xdb.store is not None:
+            levels, transitions = xdb.store.levels, xdb.store.transitions
+        else:
+            levels, transitions = {}, {}
+            for r in xdb.query(XrayLevelsTable).all():
+                edges = levels.setdefault(str(r.element), {})
+                edges[str(r.iupac_symbol)] = (r.absorption_edge,
+                                              r.fluorescence_yield,
+                                              r.jump_ratio)
+            for r in xdb.query(XrayTransitionsTable).all():
+                transitions.setdefault(str(r.element), []).append(
+                    (str(r.siegbahn_symbol), r.emission_energy, r.intensity,
+                     r.initial_level, r.final_level))
+        self.edges = dict((elem, dict(edges))
+                          for elem, edges in levels.items())
+        self.lines, self.families, self.emission = {}, {}, {}
+        for elem, rows in transitions.items():
+            self.lines[elem] = dict((r[0], r[1:]) for r in rows)
+            self.families[elem] = dict(
+                (family, self._family(self.lines[elem], family))
+                for family in self.family_names)
+            emission = self.emission[elem] = {}
+            for edge in set(r[3] for r in rows):
+                lines = dict((r[0], r[1:]) for r in rows if r[3] == edge)
+                for name in lines:
+                    for n in range(len(name) + 1):
+                        key = (edge, name[:n])
+                        if key not in emission:
+                            emission[key] = self._net(lines, name[:n])
+
+    @staticmethod
+    def _family(lines, family):
+        "weighted average of a family of lines, as in xray_line()"
+        scale = 1.e-99
+        value = 0.0
+        linit, lfinal = None, None
+        for key, val in lines.items():
+            if key.lower().startswith(family):
+                value += val[0]*val[1]
+                scale += val[1]
+                if linit is None:
+                    linit = val[2]
+                if lfinal is None:
+                    lfinal = val[3][0]
+        return (value/scale, scale, linit, lfinal)
+
+    @staticmethod
+    def _net(lines, emission):
+        "weighted energy and net probability, as in fluo_yield()"
+        net_ener, net_prob = 0., 0.
+        for name, vals in lines.items():
+            if name.startswith(emission):
+                net_ener += vals[0]*vals[1]
+                net_prob += vals[1]
+        if net_prob <= 0:
+            net_prob = 1
+        return net_ener / net_prob, net_prob
+
+    def symbol(self, element):
+        "element symbol for an atomic number or symbol"
+        if isinstance(element, numbers.Integral):
+            return str(self.symbols[element])
+        return element.title()
+
+    def line(self, element, line):
+        """(energy, intensity, initial_level, final_level) of an emission
+        line or family of lines, see xray_line()"""
+        element = self.symbol(element)
+        family = line.lower()
+        if family == 'k':
+            family = 'ka'
+        if family == 'l':
+            family = 'la'
+        if family in self.family_names:
+            return self.families.get(element, {}).get(
+                family, (0.0, 1.e-99, None, None))
+        return self.lines.get(element, {}).get(line.title(), None)
+
+    def edge(self, element, edge):
+        "(energy, fluorescence_yield, jump_ratio) of an edge, or None"
+        return self.edges.get(self.symbol(element), {}).get(edge.title(),
+                                                            None)
+
+    def net_emission(self, element, edge, emission):
+        """(weighted energy, net probability) of the lines from an edge
+        whose names start with emission, see fluo_yield()"""
+        return self.emission.get(self.symbol(element), {}).get(
+            (edge.title(), emission), (0.0, 1))
+
+
+def _level_order(level):
+    "sort key of a level name: shell ('K', 'L', ...), then subshell"
+    return ('KLMNOPQ'.find(level[:1]), int(level[1:] or 0), level)
+
+
+class LevelTables(object):
+    """Coster-Kronig transition probabilities and core-hole widths of all
+    elements, read once into arrays indexed by atomic number and level.
+
+      levels:        level names ('K', 'L1', ..., 'P3'), in shell order
+      level_index:   {level: column}
+      ck_partial:    array (nz, nlevels, nlevels) of transition
+                     probabilities, [z, initial, final]
+      ck_total:      the same for the total transition probabilities
+      corehole:      array (nz, nlevels) of core-hole widths (eV)
+
+    entries that are not tabulated are NaN.
+    """
+    def __init__(self, xdb):
+        if xdb.store is not None:
+            ck = xdb.store.coster_kronig
+            corehole = xdb.store.corehole
+        else:
+            ck = {}
+            for r in xdb.query(CosterKronigTable).all():
+                ck.setdefault((r.element, r.initial_level, r.final_level),
+                              (r.transition_probability,
+                               r.total_transition_probability))
+            corehole = xdb.query(KeskiRahkonenKrauseTable).all()
+        levels = set(r.edge for r in corehole)
+        for elem, initial, final in ck:
+            levels.update((initial, final))
+        self.levels = tuple(sorted(levels, key=_level_order))
+        self.level_index = dict((lev, i) for i, lev in enumerate(self.levels))
+
+        nz, nlev = len(xdb.element_symbols), len(self.levels)
+        self.ck_partial = np.full((nz, nlev, nlev), np.nan)
+        self.ck_total = np.full((nz, nlev, nlev), np.nan)
+        for (elem, initial, final), (prob, total) in ck.items():
+            key = (xdb.element_z[elem], self.level_index[initial],
+                   self.level_index[final])
+            self.ck_partial[key] = prob
+            self.ck_total[key] = total
+        self.corehole = np.full((nz, nlev), np.nan)
+        for r in corehole:
+            key = (r.atomic_number, self.level_index[r.edge])
+            if np.isnan(self.corehole[key]):
+                self.corehole[key] = r.width
+
+    def index(self, levels):
+        """array of columns for an array of level names, with -1 for
+        unknown levels"""
+        levels = np.asarray(levels, dtype=object)
+        return np.array([self.level_index.get(str(lev).title(), -1)
+                         for lev in levels.ravel()],
+                        dtype=int).reshape(levels.shape)
+
+    def value(self, table, z, *levels):
+        "value of table at atomic number z and level names, or None"
+        key = [z]
+        for lev in levels:
+            col = self.level_index.get(lev.title(), None)
+            if col is None:
+                return None
+            key.append(col)
+        value = float(table[tuple(key)])
+        return None if value != value else value
+
+    def lookup(self, table, z, *levels):
+        """values of table at atomic numbers z and arrays of levels,
+        broadcast against each other, NaN where not tabulated"""
+        columns = [self.index(lev) for lev in levels]
+        z, *columns = np.broadcast_arrays(z, *columns)
+        known = np.ones(z.shape, dtype=bool)
+        for col in columns:
+            known &= col >= 0
+        out = table[(z,) + tuple(np.where(known, col, 0)
+                                 for col in columns)]
+        return np.where(known, out, np.nan)
+
+
+class EnergyScan(object):
+    """Chantler and Elam data of several elements on one energy grid.
+
+    the work shared by all quantities is done once, when the scan is
+    created: the log of the energies, and for each element the Chantler
+    table window, the interpolation weights of f2 and mu and the f1
+    spline, and the Elam table positions and spline weights.  Each
+    quantity is then a few array operations, and equals the result of
+    the xrayDB method of the same name for the whole grid (without a
+    dense grid, see xrayDB.use_dense_grid()).
+
+    arguments
+    ---------
+    xdb:        xrayDB
+    energies:   energy or array of energies in eV
+    elements:   list of atomic numbers or symbols
+    smoothing, fit:  as for xrayDB.f1_chantler()
+    """
+    chantler_columns = ('f1', 'f2', 'mu_photo', 'mu_incoh', 'mu_total')
+
+    def __init__(self, xdb, energies, elements, smoothing=1, fit='window'):
+        if fit not in ('window', 'full'):
+            raise ValueError("fit must be one of 'window', 'full'")
+        self.energy = as_ndarray(energies)
+        self.loge = np.log(self.energy)
+        self.elements = [xdb.symbol(elem) for elem in elements]
+        self._symbols = dict((xdb.atomic_number(elem), elem)
+                             for elem in self.elements)
+        erange = (self.energy.min(), self.energy.max())
+
+        self._chantler = {}
+        for elem in self.elements:
+            arrays = xdb._getChantlerArrays(elem, ('energy',) +
+                                            self.chantler_columns)
+            if arrays is None:
+                self._chantler[elem] = None
+                continue
+            te, tables = arrays[0], dict(zip(self.chantler_columns,
+                                             arrays[1:]))
+            window = chantler_window(te, erange)
+            region = slice(*window)
+            loge_table = np.log(te[region])
+            weights = {
+                True: InterpIndex(self.loge, loge_table,
+                                  breaks=np.log(xdb.chantler_breaks(elem))),
+                False: InterpIndex(self.loge, loge_table)}
+            tck = chantler_f1_spline(te, tables['f1'], window,
+                                     smoothing=smoothing, fit=fit,
+                                     spline_cache=xdb.spline_cache,
+                                     label=elem)
+            logs = dict((col, np.log(tables[col][region]))
+                        for col in self.chantler_columns[1:])
+            self._chantler[elem] = (weights, tck, logs)
+
+        # Elam tables of the elements that have them, with table positions
+        # shared by tables with the same energies (coherent and incoherent
+        # scattering)
+        self._elam = {}
+        for kind in ('photo', 'coh', 'incoh'):
+            rows, tabs = {}, []
+            for elem in self.elements:
+                arrays = xdb._getElamArrays(elem, kind)
+                if arrays is not None:
+                    rows[elem] = len(tabs)
+                    tabs.append(arrays)
+            if len(tabs) == 0:
+                continue
+            tables = ElamTables(tabs)
+            positions = None
+            for other, pos, _ in self._elam.values():
+                if np.array_equal(other.lne, tables.lne):
+                    positions = pos
+            if positions is None:
+                positions = tables.positions(self.loge,
+                                             np.arange(len(tables)))
+            self._elam[kind] = (tables, positions, rows)
+
+    def _scalar(self, val):
+        "a value for each energy, as returned for an energy or array"
+        if val.shape == (1,):
+            return val[0]
+        return val
+
+    def _element(self, element):
+        "element symbol, which must be in the scan"
+        if isinstance(element, str):
+            elem = element.title()
+        else:
+            elem = self._symbols.get(int(element), None)
+        if elem not in self._chantler:
+            raise ValueError("element '%s' is not in this scan" % element)
+        return elem
+
+    def chantler(self, element, column='f1'):
+        """Chantler column ('f1', 'f2', 'mu_photo', 'mu_incoh',
+        'mu_total') of an element, or None if it has no Chantler data"""
+        if column == 'mu':
+            column = 'mu_total'
+        data = self._chantler[self._element(element)]
+        if data is None:
+            return None
+        weights, tck, logs = data
+        if column == 'f1':
+            from scipy.interpolate import splev
+            val = splev(self.energy, tck)
         else:
-            self.session = sessionmaker(bind=self.engine, **kwargs)()
-        self.metadata = MetaData(self.engine)
-        self.metadata.reflect()
-        tables = self.tables = self.metadata.tables
-        try:
-            clear_mappers()
-        except:
-            pass
+            split = column in CHANTLER_EDGE_COLUMNS
+            val = np.exp(weights[split](logs[column]))
+        return self._scalar(val)
+
+    def f1_chantler(self, element):
+        "f1 of an element, as xrayDB.f1_chantler()"
+        return self.chantler(element, 'f1')
+
+    def f2_chantler(self, element):
+        "f2 of an element, as xrayDB.f2_chantler()"
+        return self.chantler(element, 'f2')
+
+    def mu_chantler(self, element, incoh=False, photo=False):
+        "mu/rho (cm^2/gr) of an element, as xrayDB.mu_chantler()"
+        col = 'mu_total'
+        if photo:
+            col = 'mu_photo'
+        elif incoh:
+            col = 'mu_incoh'
+        return self.chantler(element, col)
+
+    def Elam_CrossSection(self, element, kind='photo'):
+        """Elam cross-section of an element, as xrayDB.Elam_CrossSection(),
+        or None if it has no Elam data"""
+        elem = self._element(element)
+        tables, positions, rows = self._elam.get(_elam_kind(kind),
+                                                 (None, None, {}))
+        if elem not in rows:
+            return None
+        row = rows[elem]
+        return self._scalar(tables.spline(tuple(p[row] for p in positions)))
+
+    def mu_elam(self, element, kind='total'):
+        "mu/rho (cm^2/gr) of an element, as xrayDB.mu_elam()"
+        xsec = self.Elam_CrossSection(element, 'photo')
+        if kind.lower().startswith('tot'):
+            xsec += self.Elam_CrossSection(element, 'coh')
+            xsec += self.Elam_CrossSection(element, 'incoh')
+        return xsec
+
+
+_xraydb = None
+_xraydb_lock = threading.Lock()
+
+
+def get_xraydb():
+    """return the xrayDB instance shared by the module-level functions,
+    connecting to the database on first use"""
+    global _xraydb
+    if _xraydb is None:
+        with _xraydb_lock:
+            if _xraydb is None:
+                _xraydb = xrayDB()
+    return _xraydb
+
+
+_mapper_lock = threading.Lock()
+_mapped = False
+
+
+def _map_tables(tables):
+    """map the table classes to the reflected tables.
+
+    this is done once per process: all xrayDB instances share the same
+    mapping, so creating a new instance never changes the mapping used
+    by other instances (or other threads).
+
+    the mapping is bound to the Table objects reflected by the first
+    instance that connects.  Other instances query their own database
+    through their own sessions, but with those Table objects, so all
+    database files used in one process must have the same schema.
+    """
+    global _mapped
+    with _mapper_lock:
+        if _mapped:
+            return
         mapper(ChantlerTable,            tables['Chantler'])
         mapper(WaasmaierTable,           tables['Waasmaier'])
         mapper(KeskiRahkonenKrauseTable, tables['KeskiRahkonen_Krause'])
@@ -206,35 +1483,260 @@ class xrayDB(object):
         mapper(CosterKronigTable,        tables['Coster_Kronig'])
         mapper(PhotoAbsorptionTable,     tables['photoabsorption'])
         mapper(ScatteringTable,          tables['scattering'])
+        _mapped = True
+
+
+class xrayDB(object):
+    """interface to Xray Data
+
+    with preload=True, all tables are read once into a TableStore
+    and all accessors are served from memory.  With binary=filename,
+    the TableStore is memory-mapped from a file made by make_binary_db();
+    if the database dbname exists, the file must have been made from it.
+
+    spline fits for f1 are kept in a SplineCache of spline_cache_size
+    entries, read from spline_cache_file if that is given.
+
+    use_dense_grid() switches the Chantler and Elam accessors to
+    precomputed tables on a dense energy grid (see DenseGrid).
+    """
+    def __init__(self, dbname='xrayref.db', read_only=True, preload=False,
+                 spline_cache_size=256, spline_cache_file=None, binary=None):
+        """connect to an existing database.
+
+        with binary=filename, no database connection is made here: the
+        engine, session and table mapping are set up on first use."""
+        if not os.path.exists(dbname):
+            parent, child = os.path.split(__file__)
+            dbname = os.path.join(parent, dbname)
+        self.dbname = dbname
+        self.read_only = read_only
+        self._engine = None
+        self._session = None
+        self._metadata = None
+        self._connect_lock = threading.Lock()
+        if binary is None:
+            self._connect()
+        self.store = None
+        if binary is not None:
+            if not os.path.exists(binary):
+                binary = os.path.join(os.path.dirname(__file__), binary)
+            # a binary file made from another version of the database
+            # is rejected, if the database is there to compare with
+            source_checksum = None
+            if os.path.exists(dbname):
+                source_checksum = _sha256(dbname)
+            self.store = TableStore.load_binary(
+                binary, source_checksum=source_checksum)
+        elif preload:
+            self.store = TableStore(self)
+        self.binary = binary
+        self._checksum = None
+        self._load_element_arrays()
+        self._load_waasmaier_arrays()
+        self.spline_cache = SplineCache(maxsize=spline_cache_size,
+                                        filename=spline_cache_file)
+        self.dense = None
+        self._elam_packed = {}
+        self._chantler_arrays = {}
+        self._chantler_breaks = {}
+        self._line_index = None
+        self._level_tables = None
+
+    def checksum(self):
+        """SHA-256 hex digest of the data file in use: the binary file if
+        given, otherwise the database.  It is recomputed when the size or
+        modification time of the file changes."""
+        filename = self.binary if self.binary is not None else self.dbname
+        st = os.stat(filename)
+        stamp = (filename, st.st_size, st.st_mtime_ns)
+        if self._checksum is None or self._checksum[0] != stamp:
+            self._checksum = (stamp, _sha256(filename))
+        return self._checksum[1]
+
+    def use_dense_grid(self, emin=1000.0, emax=100000.0,
+                       points_per_decade=1000, elements=None):
+        """resample Chantler and Elam data onto a dense log-uniform
+        energy grid between emin and emax (in eV), and serve f1, f2,
+        mu and Elam cross-sections from it for energies in that range.
+
+        arguments
+        ---------
+        emin, emax:         energy range of the grid, in eV
+        points_per_decade:  grid points per decade of energy
+        elements:           list of elements (default: all with Chantler data)
+
+        returns the DenseGrid, whose est_error and error_report() give
+        the estimated maximum relative error against the exact calculation.
+        Use use_dense_grid(None) to go back to the exact calculation.
+        """
+        self.dense = None
+        if emin is not None:
+            self.dense = DenseGrid(self, emin=emin, emax=emax,
+                                   points_per_decade=points_per_decade,
+                                   elements=elements)
+        return self.dense
+
+    def _connect(self):
+        """create the engine, the per-thread session and the table mapping,
+        once per instance"""
+        with self._connect_lock:
+            if self._session is not None:
+                return
+            if not os.path.exists(self.dbname):
+                raise IOError("Database '%s' not found!" % self.dbname)
+            if not isxrayDB(self.dbname):
+                raise ValueError(
+                    "'%s' is not a valid X-ray Database file!" % self.dbname)
+            engine = make_engine(self.dbname, read_only=self.read_only)
+            metadata = MetaData(engine)
+            metadata.reflect()
+            _map_tables(metadata.tables)
+            self._engine = engine
+            self._metadata = metadata
+            # one session (and so one connection) per thread
+            self._session = scoped_session(
+                sessionmaker(bind=engine, autoflush=not self.read_only))
+
+    @property
+    def engine(self):
+        self._connect()
+        return self._engine
+
+    @property
+    def session(self):
+        self._connect()
+        return self._session
+
+    @property
+    def metadata(self):
+        self._connect()
+        return self._metadata
+
+    @property
+    def tables(self):
+        return self.metadata.tables
 
     def close(self):
-        "close session"
-        self.session.flush()
-        self.session.close()
+        "close session of the calling thread"
+        if self._session is None:
+            return
+        if not self.read_only:
+            self._session.flush()
+        self._session.remove()
 
     def query(self, *args, **kws):
         "generic query"
         return self.session.query(*args, **kws)
 
+    def _load_element_arrays(self):
+        """read elements table into arrays indexed by atomic number:
+        element_symbols, element_masses, element_densities, and
+        the dictionary element_z of symbol -> z"""
+        if self.store is not None:
+            rows = list(self.store.elements.values())
+        else:
+            rows = self.query(ElementsTable).all()
+        nz = 1 + max(int(r.atomic_number) for r in rows)
+        self.element_symbols = np.array([''] * nz, dtype=object)
+        self.element_masses = np.full(nz, np.nan)
+        self.element_densities = np.full(nz, np.nan)
+        self.element_z = {}
+        for r in rows:
+            z = int(r.atomic_number)
+            self.element_symbols[z] = str(r.element)
+            self.element_masses[z] = r.molar_mass
+            self.element_densities[z] = r.density
+            self.element_z[str(r.element)] = z
+
+    def _load_waasmaier_arrays(self):
+        """read the Waasmaier and Kirfel table once into arrays of
+        f0_offsets (n_ions), f0_scales and f0_exponents (n_ions, 5), with
+        f0_ion_names, f0_elements and f0_atomic_numbers in the same order.
+        f0_index maps ion names and atomic numbers (the first ion of an
+        element) to rows of these arrays."""
+        if self.store is not None:
+            rows = [(z, elem, ion) + tuple(self.store.waasmaier[ion])
+                    for z, elem, ion in self.store.ions]
+        else:
+            rows = [(int(r.atomic_number), str(r.element), str(r.ion),
+                     r.offset, json.loads(r.scale), json.loads(r.exponents))
+                    for r in self.query(WaasmaierTable).all()]
+        self.f0_atomic_numbers = np.array([r[0] for r in rows], dtype=int)
+        self.f0_elements = [r[1] for r in rows]
+        self.f0_ion_names = [r[2] for r in rows]
+        self.f0_offsets = np.array([r[3] for r in rows], dtype=float)
+        self.f0_scales = np.array([r[4] for r in rows], dtype=float)
+        self.f0_exponents = np.array([r[5] for r in rows], dtype=float)
+        self.f0_index = {}
+        for i, (z, elem, ion) in enumerate(zip(self.f0_atomic_numbers,
+                                               self.f0_elements,
+                                               self.f0_ion_names)):
+            self.f0_index.setdefault(ion, i)
+            self.f0_index.setdefault(int(z), i)
+
+    def _f0_row(self, ion):
+        "return row of the f0 arrays for an ion name or atomic number"
+        if isinstance(ion, (int, np.integer)):
+            return self.f0_index.get(int(ion), None)
+        return self.f0_index.get(ion.title(), None)
+
+    def _z(self, element):
+        "return z for an element symbol or atomic number"
+        if isinstance(element, (int, np.integer)):
+            if 0 < element < len(self.element_symbols):
+                return int(element)
+        else:
+            z = self.element_z.get(element.title(), None)
+            if z is not None:
+                return z
+        raise ValueError("unknown element '%s'" % element)
+
+    def _zarray(self, elements):
+        "return array of z for an array of element symbols or numbers"
+        elements = np.asarray(elements)
+        if elements.dtype.kind in 'iu':
+            if np.any((elements < 1) |
+                      (elements >= len(self.element_symbols))):
+                raise ValueError("unknown atomic number in %s" % elements)
+            return elements.astype(int)
+        unique, index = np.unique(elements, return_inverse=True)
+        zunique = np.array([self._z(str(e)) for e in unique], dtype=int)
+        return zunique[index].reshape(elements.shape)
+
     def atomic_number(self, element):
         "return z for element name"
-        return int(self._getElementData(element).atomic_number)
+        return self._z(element)
 
     def atomic_symbol(self, z):
         "return element symbol from z"
-        return self._getElementData(z).element
+        return self.element_symbols[self._z(z)]
 
     def atomic_mass(self, element):
         "return molar mass (amu) from element symbol or atomic number"
-        if isinstance(element, int):
-            element = atomic_symbol(element)
-        return self._getElementData(element).molar_mass
+        return float(self.element_masses[self._z(element)])
 
     def atomic_density(self, element):
         "return density (gr/cm^3) from element symbol or atomic number"
-        if isinstance(element, int):
-            element = atomic_symbol(element)
-        return self._getElementData(element).density
+        return float(self.element_densities[self._z(element)])
+
+    def atomic_numbers(self, elements):
+        "return array of z for array of element symbols or atomic numbers"
+        return self._zarray(elements)
+
+    def atomic_symbols(self, elements):
+        "return array of element symbols for array of atomic numbers"
+        return self.element_symbols[self._zarray(elements)]
+
+    def atomic_masses(self, elements):
+        """return array of molar masses (amu) for array of element
+        symbols or atomic numbers"""
+        return self.element_masses[self._zarray(elements)]
+
+    def atomic_densities(self, elements):
+        """return array of densities (gr/cm^3) for array of element
+        symbols or atomic numbers"""
+        return self.element_densities[self._zarray(elements)]
 
     def chantler_data(self, element, energy, column, **kws):
         """returns data from Chantler tables.
@@ -247,6 +1749,20 @@ class xrayDB(object):
         """
         return self._getChantler(element, energy, column=column, **kws)
 
+    def chantler_columns(self, element, energy,
+                         columns=('f1', 'f2', 'mu_photo', 'mu_total'),
+                         **kws):
+        """returns data for several columns of the Chantler tables
+        in one pass, as a dictionary with column names as keys.
+
+        arguments
+        ---------
+        element:  atomic number, atomic symbol for element
+        energy:   energy or array of energies in eV
+        columns:  list of 'f1', 'f2', 'mu_photo', 'mu_incoh', 'mu_total'
+        """
+        return self._getChantlerColumns(element, energy, columns, **kws)
+
     def f1_chantler(self, element, energy, **kws):
         """returns real part of anomalous x-ray scattering factor for
         a selected element and input energy (or array of energies) in eV.
@@ -298,25 +1814,6 @@ class xrayDB(object):
             col = 'mu_incoh'
         return self._getChantler(element, energy, column=col)
 
-    def mu_elam(element, energy, kind='total'):
-        """returns x-ray mass attenuation coefficient, mu/rho, for a
-        selected element and input energy (or array of energies) in eV.
-        Data is from the Elam tables.
-
-        Values returned are in units of cm^2/gr.
-
-        arguments
-        ---------
-        element:  atomic number, atomic symbol for element
-        energy:   energy or array of energies in eV
-        kind:     one of 'total' (default) 'photo', 'coh', and 'incoh' for
-                total, photo-absorption, coherent scattering, and
-                incoherent scattering cross sections, respectively.
-
-        Data from Elam, Ravel, and Sieber.
-        """
-        return self.mu_elam(element, energy, kind=kind)
-
     def f0_ions(self, element=None):
         """return list of ion names supported for the .f0() calculation
         from Waasmaier and Kirfel
@@ -329,13 +1826,14 @@ class xrayDB(object):
         if element is None, all 211 ions are returned.  If element is
         not None, the ions for that element (atomic symbol) are returned
         """
-        rows = self.query(WaasmaierTable)
-        if element is not None:
-            if isinstance(element, int):
-                rows = rows.filter(WaasmaierTable.atomic_number == element)
-            else:
-                rows = rows.filter(WaasmaierTable.element == element.title())
-        return [str(r.ion) for r in rows.all()]
+        if element is None:
+            return list(self.f0_ion_names)
+        if isinstance(element, int):
+            return [ion for z, ion in zip(self.f0_atomic_numbers,
+                                          self.f0_ion_names) if z == element]
+        element = element.title()
+        return [ion for elem, ion in zip(self.f0_elements,
+                                         self.f0_ion_names) if elem == element]
 
     def f0(self, ion, q):
         """Calculate f0(q) -- elastic x-ray scattering factor
@@ -353,54 +1851,189 @@ class xrayDB(object):
         Z values from 1 to 98 (and symbols 'H' to 'Cf') are supported.
         The list of ionic symbols can be read with the function .f0_ions()
         """
-        tab = WaasmaierTable
-        row = self.query(tab)
-        if isinstance(ion, int):
-            row = row.filter(tab.atomic_number == ion).all()
+        row = self._f0_row(ion)
+        if row is not None:
+            return self._f0_rows(np.array([row]), as_ndarray(q))[0]
+
+    def f0_many(self, ions=None, q=0.0):
+        """Calculate f0(q) for several ions at once
+
+        arguments
+        ---------
+        ions: list of atomic numbers, atomic symbols or ionic symbols
+              (default: all ions, in the order of .f0_ions())
+        q:    single q value, list, tuple, or numpy array of q values
+              q = sin(theta) / lambda
+
+        returns array of shape (len(ions),) + q.shape.  Unknown ions
+        raise a ValueError.
+        """
+        if ions is None:
+            rows = np.arange(len(self.f0_ion_names))
         else:
-            row = row.filter(tab.ion == ion.title()).all()
-        if len(row) > 0:
-            row = row[0]
-        if isinstance(row, tab):
-            q = as_ndarray(q)
-            f0 = row.offset
-            for s, e in zip(json.loads(row.scale), json.loads(row.exponents)):
-                f0 += s * np.exp(-e*q*q)
-            return f0
-
-    def _getChantler(self, element, energy, column='f1', smoothing=1):
+            rows = []
+            for ion in ions:
+                row = self._f0_row(ion)
+                if row is None:
+                    raise ValueError("unknown ion '%s'" % ion)
+                rows.append(row)
+            rows = np.array(rows, dtype=int)
+        return self._f0_rows(rows, as_ndarray(q))
+
+    def _f0_rows(self, rows, q):
+        """f0 for rows of the f0 arrays at q, shape (len(rows),) + q.shape.
+        The Gaussian terms are added one at a time, in table order, so
+        that all ions are evaluated together with the same rounding as
+        for a single ion."""
+        shape = (len(rows),) + (1,) * q.ndim
+        f0 = np.empty((len(rows),) + q.shape)
+        f0[...] = self.f0_offsets[rows].reshape(shape)
+        scales = self.f0_scales[rows]
+        exponents = self.f0_exponents[rows]
+        for k in range(scales.shape[1]):
+            f0 += (scales[:, k].reshape(shape) *
+                   np.exp(-exponents[:, k].reshape(shape) * q * q))
+        return f0
+
+    def _getChantlerArrays(self, element, columns):
+        """return list of arrays for the Chantler columns
+        ('energy', 'f1', 'f2', 'mu_photo', 'mu_incoh', 'mu_total')
+        of an element, or None if the element is not found
+        """
+        if self.store is not None:
+            if isinstance(element, int):
+                element = self.store.chantler_ids.get(element, None)
+            else:
+                element = element.title()
+            row = self.store.chantler.get(element, None)
+            if row is None:
+                return None
+            return [row[col] for col in columns]
+        # without a store, each element is queried and decoded once
+        key = element if isinstance(element, int) else element.title()
+        arrays = self._chantler_arrays.get(key, None)
+        if arrays is None:
+            tab = ChantlerTable
+            row = self.query(tab)
+            if isinstance(element, int):
+                row = row.filter(tab.id == element).all()
+            else:
+                row = row.filter(tab.element == key).all()
+            if len(row) == 0:
+                return None
+            arrays = dict((col, _json_array(getattr(row[0], col)))
+                          for col in ('energy', 'f1', 'f2', 'mu_photo',
+                                      'mu_incoh', 'mu_total'))
+            self._chantler_arrays[key] = arrays
+        return [arrays[col] for col in columns]
+
+    def chantler_breaks(self, element):
+        """energies (in eV) of the absorption edges of an element as
+        located in its Chantler table, see chantler_edge_breaks().
+        Interpolation of f2 and mu is split at these energies.
+        Returns None if the element is not in the Chantler table.
+        """
+        key = element if isinstance(element, int) else element.title()
+        if key not in self._chantler_breaks:
+            arrays = self._getChantlerArrays(element, ('energy', 'f2'))
+            if arrays is None:
+                return None
+            symbol = self.symbol(element) if isinstance(element, int) else key
+            edges = [e[0] for e in self.xray_edges(symbol).values()]
+            self._chantler_breaks[key] = chantler_edge_breaks(
+                arrays[0], arrays[1], edges)
+        return self._chantler_breaks[key]
+
+    def _getChantler(self, element, energy, column='f1', smoothing=1,
+                     fit='window', chunk_size=None, out=None):
         """return energy-dependent data from Chantler table
         columns: f1, f2, mu_photo, mu_incoh, mu_total
+
+        f1 is evaluated from a smoothing spline, fitted either to a
+        window of the table around the requested energies (fit='window',
+        default) or once to the whole table (fit='full').  Fitted splines
+        are kept in self.spline_cache.
+
+        with chunk_size or out given, energies are evaluated in blocks
+        of chunk_size, and written to the array out (see chunked()).
         """
-        tab = ChantlerTable
-        row = self.query(tab)
-        if isinstance(element, int):
-            row = row.filter(tab.id == element).all()
-        else:
-            row = row.filter(tab.element == element.title()).all()
-        if len(row) > 0:
-            row = row[0]
-        if isinstance(row, tab):
-            energy = as_ndarray(energy)
-            emin, emax = min(energy), max(energy)
-            # te = self.chantler_energies(element, emin=emin, emax=emax)
-            te = np.array(json.loads(row.energy))
-            nemin = max(0, -5 + max(np.where(te <= emin)[0]))
-            nemax = min(len(te), 6 + max(np.where(te <= emax)[0]))
-            region = np.arange(nemin, nemax)
-            te = te[region]
-            if column == 'mu':
-                column = 'mu_total'
-            ty = np.array(json.loads(getattr(row, column)))[region]
-            if column == 'f1':
-                out = UnivariateSpline(te, ty, s=smoothing)(energy)
-            else:
-                out = np.exp(np.interp(np.log(energy),
-                                       np.log(te),
-                                       np.log(ty)))
-            if isinstance(out, np.ndarray) and len(out) == 1:
-                return out[0]
-            return out
+        if column == 'mu':
+            column = 'mu_total'
+        if out is not None:
+            out = {column: out}
+        out = self._getChantlerColumns(element, energy, (column,),
+                                       smoothing=smoothing, fit=fit,
+                                       chunk_size=chunk_size, out=out)
+        if out is not None:
+            return out[column]
+
+    def _getChantlerColumns(self, element, energy, columns,
+                            smoothing=1, fit='window', erange=None,
+                            chunk_size=None, out=None):
+        """return dictionary of energy-dependent data for several columns
+        of the Chantler table, sharing the table lookup, the energy window
+        and the log-energy interpolation weights.
+
+        erange is the (emin, emax) used for the table window and for
+        choosing the dense grid (default: the range of energy).  With
+        chunk_size or out given, energies are evaluated in blocks of
+        chunk_size with the range of all energies, and written to the
+        dictionary of arrays out.
+        """
+        if fit not in ('window', 'full'):
+            raise ValueError("fit must be one of 'window', 'full'")
+        columns = ['mu_total' if col == 'mu' else col for col in columns]
+        if chunk_size is not None or out is not None or erange is None:
+            erange = (np.min(energy), np.max(energy))
+        evaluate = self._chantler_columns_func(element, columns, erange,
+                                               smoothing=smoothing, fit=fit)
+        if evaluate is None:
+            return None
+        if chunk_size is not None or out is not None:
+            return chunked(evaluate, [energy], chunk_size=chunk_size, out=out)
+        return evaluate(energy)
+
+    def _chantler_columns_func(self, element, columns, erange, smoothing=1,
+                               fit='window'):
+        """function of energy giving the dictionary of Chantler columns,
+        as _getChantlerColumns(), for energies within erange = (emin, emax).
+        The dense grid is used when it covers erange, and the tables are
+        looked up once, not at each call.  Returns None if the element is
+        not in the Chantler table."""
+        label = element if isinstance(element, int) else element.title()
+        tables = {}
+
+        def fetch():
+            arrays = self._getChantlerArrays(element,
+                                             ['energy'] + list(columns))
+            if arrays is not None:
+                tables['energy'] = arrays[0]
+                tables['columns'] = dict(zip(columns, arrays[1:]))
+                tables['breaks'] = self.chantler_breaks(label)
+            return arrays is not None
+
+        def tabulated(energy):
+            if not tables:
+                fetch()
+            return chantler_columns(tables['energy'], tables['columns'],
+                                    energy, smoothing=smoothing, fit=fit,
+                                    spline_cache=self.spline_cache,
+                                    label=label, erange=erange,
+                                    breaks=tables['breaks'])
+
+        dense = self.dense
+        if (dense is not None and not isinstance(element, int) and
+                smoothing == dense.smoothing and fit == dense.fit and
+                dense.covers(label, np.array(erange))):
+            def evaluate(energy):
+                out = dense.chantler(label, energy, columns)
+                if out is None:
+                    out = tabulated(energy)
+                return out
+            return evaluate
+        if not fetch():
+            return None
+        return tabulated
 
     def chantler_energies(self, element, emin=0, emax=1.e9):
         """ return array of energies (in eV) at which data is
@@ -413,19 +2046,10 @@ class xrayDB(object):
         emin:  lower bound of energies in eV returned (default=0)
         emax:  upper bound of energies in eV returned (default=1.e9)
         """
-        tab = ChantlerTable
-        row = self.query(tab)
-        if isinstance(element, int):
-            row = row.filter(tab.id == element).all()
-        else:
-            row = row.filter(tab.element == element.title()).all()
-        if len(row) > 0:
-            row = row[0]
-        if not isinstance(row, tab):
+        arrays = self._getChantlerArrays(element, ('energy',))
+        if arrays is None:
             return None
-        te = np.array(json.loads(row.energy))
-        tf1 = np.array(json.loads(row.f1))
-        tf2 = np.array(json.loads(row.f2))
+        te = arrays[0]
 
         if emin <= min(te):
             nemin = 0
@@ -441,6 +2065,9 @@ class xrayDB(object):
     def f1_chantler(self, element, energy, **kws):
         """returns f1 -- real part of anomalous x-ray scattering factor
         for selected input energy (or energies) in eV.
+
+        use fit='full' to fit the spline once to the whole table
+        instead of a window around the energies.
         """
         return self._getChantler(element, energy, column='f1', **kws)
 
@@ -450,7 +2077,7 @@ class xrayDB(object):
         """
         return self._getChantler(element, energy, column='f2', **kws)
 
-    def mu_chantler(self, element, energy, incoh=False, photo=False):
+    def mu_chantler(self, element, energy, incoh=False, photo=False, **kws):
         """returns mu/rho in cm^2/gr -- x-ray mass attenuation coefficient
         for selected input energy (or energies) in eV.
         default is to return total attenuation coefficient.
@@ -463,35 +2090,23 @@ class xrayDB(object):
             col = 'mu_photo'
         elif incoh:
             col = 'mu_incoh'
-        return self._getChantler(element, energy, column=col)
-
-    def _getElementData(self, element):
-        "get data from elements table"
-        tab = ElementsTable
-        row = self.query(tab)
-        if isinstance(element, int):
-            row = row.filter(tab.atomic_number == element).all()
-        else:
-            row = row.filter(tab.element == element.title()).all()
-        if len(row) > 0:
-            row = row[0]
-        return row
+        return self._getChantler(element, energy, column=col, **kws)
 
     def zofsym(self, element):
         "return z for element name"
-        return int(self._getElementData(element).atomic_number)
+        return self._z(element)
 
     def symbol(self, z):
         "return element symbol from z"
-        return self._getElementData(z).element
+        return self.element_symbols[self._z(z)]
 
     def molar_mass(self, element):
         "return molar mass of element"
-        return self._getElementData(element).molar_mass
+        return float(self.element_masses[self._z(element)])
 
     def density(self, element):
         "return density of pure element"
-        return self._getElementData(element).density
+        return float(self.element_densities[self._z(element)])
 
     def xray_edges(self, element):
         """returns dictionary of all x-ray absorption
@@ -504,6 +2119,8 @@ class xrayDB(object):
         """
         if isinstance(element, int):
             element = self.symbol(element)
+        if self.store is not None:
+            return dict(self.store.levels.get(element.title(), {}))
         tab = XrayLevelsTable
         out = {}
         for r in self.query(tab).filter(tab.element == element.title()).all():
@@ -536,14 +2153,24 @@ class xrayDB(object):
         """
         if isinstance(element, int):
             element = self.symbol(element)
-        tab = XrayTransitionsTable
-        row = self.query(tab).filter(tab.element == element.title())
         if excitation_energy is not None:
             initial_level = []
             for ilevel, dat in self.xray_edges(element).items():
                 if dat[0] < excitation_energy:
                     initial_level.append(ilevel.title())
 
+        if self.store is not None:
+            rows = self.store.transitions.get(element.title(), [])
+            if initial_level is not None:
+                if isinstance(initial_level, (list, tuple)):
+                    rows = [r for r in rows if r[3] in initial_level]
+                else:
+                    rows = [r for r in rows
+                            if r[3] == initial_level.title()]
+            return dict((r[0], r[1:]) for r in rows)
+
+        tab = XrayTransitionsTable
+        row = self.query(tab).filter(tab.element == element.title())
         if initial_level is not None:
             if isinstance(initial_level, (list, tuple)):
                 row = row.filter(tab.initial_level.in_(initial_level))
@@ -555,42 +2182,86 @@ class xrayDB(object):
                                            r.initial_level, r.final_level)
         return out
 
+    def line_index(self):
+        """LineIndex of the edges and emission lines of all elements,
+        built on first use"""
+        if self._line_index is None:
+            self._line_index = LineIndex(self)
+        return self._line_index
+
+    def level_tables(self):
+        """LevelTables of the Coster-Kronig probabilities and core-hole
+        widths of all elements, built on first use"""
+        if self._level_tables is None:
+            self._level_tables = LevelTables(self)
+        return self._level_tables
+
+    def energy_scan(self, energies, elements, smoothing=1, fit='window'):
+        """EnergyScan for evaluating Chantler and Elam data of elements
+        on one energy grid, sharing the table lookups and interpolation
+        weights between all quantities
+
+        >>> scan = xdb.energy_scan(np.linspace(7000, 7500, 501), ['Fe', 'O'])
+        >>> mu = scan.mu_chantler('Fe')
+        >>> f1, f2 = scan.f1_chantler('Fe'), scan.f2_chantler('Fe')
+        """
+        return EnergyScan(self, energies, elements, smoothing=smoothing,
+                          fit=fit)
+
     def CK_probability(self, element, initial, final, total=True):
-        """return transition probability for an element and initial/final levels
+        """return transition probability for an element and initial/final levels,
+        or None if the transition is not tabulated
+
+        initial and final may also be arrays of level names, broadcast
+        against each other, giving an array of probabilities that is NaN
+        for transitions that are not tabulated.
         """
-        if isinstance(element, int):
-            element = self.symbol(element)
-        tab = CosterKronigTable
-        row = self.query(tab).filter(
-            tab.element == element.title()
-            ).filter(
-            tab.initial_level == initial.title()
-            ).filter(
-            tab.final_level == final.title()).all()
-        if len(row) > 0:
-            row = row[0]
-        if isinstance(row, tab):
-            if total:
-                return row.total_transition_probability
-            else:
-                return row.transition_probability
+        scalar = isinstance(initial, str) and isinstance(final, str)
+        if scalar and self.store is not None:
+            if isinstance(element, int):
+                element = self.symbol(element)
+            row = self.store.coster_kronig.get(
+                (element.title(), initial.title(), final.title()), None)
+            if row is not None:
+                return row[1] if total else row[0]
+            return None
+        tables = self.level_tables()
+        table = tables.ck_total if total else tables.ck_partial
+        if scalar:
+            return tables.value(table, self._z(element), initial, final)
+        return tables.lookup(table, self._z(element), initial, final)
 
     def corehole_width(self, element=None, edge=None):
         """returns core hole width for an element and edge
         if element is None, values are returned for all elements
         if edge is None, values are return for all edges"""
-        tab = KeskiRahkonenKrauseTable
-        rows = self.query(tab)
         has_elem = element is not None
         has_edge = edge is not None
-        if has_elem:
-            if isinstance(element, int):
-                rows = rows.filter(tab.atomic_number == element)
-            else:
-                rows = rows.filter(tab.element == element.title())
-        if has_edge:
-            rows = rows.filter(tab.edge == edge.title())
-        out = rows.all()
+        if has_elem and has_edge:
+            tables = self.level_tables()
+            width = tables.value(tables.corehole, self._z(element), edge)
+            if width is not None:
+                return width
+        if self.store is not None:
+            out = self.store.corehole
+            if has_elem:
+                if isinstance(element, int):
+                    out = [r for r in out if r.atomic_number == element]
+                else:
+                    out = [r for r in out if r.element == element.title()]
+            if has_edge:
+                out = [r for r in out if r.edge == edge.title()]
+        else:
+            tab = KeskiRahkonenKrauseTable
+            rows = self.query(tab)
+            if has_elem:
+                if isinstance(element, int):
+                    rows = rows.filter(tab.atomic_number == element)
+                else:
+                    rows = rows.filter(tab.element == element.title())
+            if has_edge:
+                rows = rows.filter(tab.edge == edge.title())
+            out = rows.all()
         if len(out) == 1:
             return(out[0].width)
         elif has_elem:
@@ -600,7 +2271,31 @@ class xrayDB(object):
         else:
             return [(r.atomic_number, r.edge, r.width) for r in out]
 
-    def Elam_CrossSection(self, element, energies, kind='photo'):
+    def corehole_width_many(self, elements=None, edges=None):
+        """returns core hole widths (in eV) for several elements and edges
+
+        arguments
+        ---------
+        elements:  list of atomic numbers or symbols (default: all
+                   elements with tabulated widths)
+        edges:     list of edges (default: all levels of level_tables())
+
+        returns array of shape (len(elements), len(edges)), which is NaN
+        for widths that are not tabulated.
+        """
+        tables = self.level_tables()
+        if elements is None:
+            elements = np.where(~np.all(np.isnan(tables.corehole),
+                                        axis=1))[0]
+        if edges is None:
+            edges = tables.levels
+        z = np.array([self._z(e) for e in elements], dtype=int)
+        z = z.reshape(-1, 1)
+        return tables.lookup(tables.corehole, z,
+                             np.asarray(edges, dtype=object).reshape(1, -1))
+
+    def Elam_CrossSection(self, element, energies, kind='photo',
+                          chunk_size=None, out=None):
         """returns Elam Cross Section values for an element and energies
 
         arguments
@@ -611,42 +2306,71 @@ class xrayDB(object):
         kind:     one of 'photo', 'coh', and 'incoh' for photo-absorption,
                   coherent scattering, and incoherent scattering
                   cross sections, respectively.
+        chunk_size, out:  if either is given, energies are evaluated in
+                  blocks of chunk_size, and written to the array out.
 
         Data from Elam, Ravel, and Sieber.
         """
         if isinstance(element, int):
             element = self.symbol(element)
-        energies = 1.0 * as_ndarray(energies)
+        if chunk_size is None and out is None:
+            return self._elam(element, energies, kind, self.dense)
+        if self._getElamArrays(element, kind) is None:
+            return None
+        dense = self._dense_for(element, energies)
+        return chunked(lambda e: self._elam(element, e, kind, dense),
+                       [energies], chunk_size=chunk_size, out=out)
+
+    def _dense_for(self, element, energies):
+        """the dense grid if it covers element at all energies, or None,
+        so that all blocks of a chunked evaluation use the same method"""
+        dense = self.dense
+        if dense is not None and dense.covers(element.title(),
+                                              as_ndarray(energies)):
+            return dense
+        return None
+
+    def _elam(self, element, energies, kind, dense):
+        "Elam cross-section for an element symbol, from dense if not None"
+        if dense is not None:
+            out = dense.elam(element.title(), energies, kind)
+            if out is not None:
+                return out
+        arrays = self._getElamArrays(element, kind)
+        if arrays is None:
+            return None
+        return elam_cross_section(arrays[0], arrays[1], arrays[2], energies)
+
+    def _getElamArrays(self, element, kind='photo'):
+        """return (log_energy, log_value, log_value_spline) arrays
+        from Elam tables for an element symbol and kind
+        ('photo', 'coh', 'incoh'), or None if the element is not found
+        """
+        kind = _elam_kind(kind)
+        tab = PhotoAbsorptionTable if kind == 'photo' else ScatteringTable
 
-        tab = ScatteringTable
-        if kind == 'photo':
-            tab = PhotoAbsorptionTable
+        if self.store is not None:
+            return self.store.elam.get((kind, element.title()), None)
 
         row = self.query(tab).filter(tab.element == element.title()).all()
         if len(row) > 0:
             row = row[0]
         if not isinstance(row, tab):
             return None
-
-        tab_lne = np.array(json.loads(row.log_energy))
-        if kind.lower().startswith('coh'):
-            tab_val = np.array(json.loads(row.log_coherent_scatter))
-            tab_spl = np.array(json.loads(row.log_coherent_scatter_spline))
-        elif kind.lower().startswith('incoh'):
-            tab_val = np.array(json.loads(row.log_incoherent_scatter))
-            tab_spl = np.array(json.loads(row.log_incoherent_scatter_spline))
-        else:
-            tab_val = np.array(json.loads(row.log_photoabsorption))
-            tab_spl = np.array(json.loads(row.log_photoabsorption_spline))
-
-        emin_tab = 10*int(0.102*np.exp(tab_lne[0]))
-        energies[np.where(energies < emin_tab)] = emin_tab
-        out = np.exp(elam_spline(tab_lne, tab_val, tab_spl, np.log(energies)))
-        if len(out) == 1:
-            return out[0]
-        return out
-
-    def mu_elam(self, element, energies, kind='total'):
+        if kind == 'coh':
+            return (_json_array(row.log_energy),
+                    _json_array(row.log_coherent_scatter),
+                    _json_array(row.log_coherent_scatter_spline))
+        elif kind == 'incoh':
+            return (_json_array(row.log_energy),
+                    _json_array(row.log_incoherent_scatter),
+                    _json_array(row.log_incoherent_scatter_spline))
+        return (_json_array(row.log_energy),
+                _json_array(row.log_photoabsorption),
+                _json_array(row.log_photoabsorption_spline))
+
+    def mu_elam(self, element, energies, kind='total', chunk_size=None,
+                out=None):
         """returns X-ray attenuation cross section for an element
         at energies (in eV)
 
@@ -658,17 +2382,101 @@ class xrayDB(object):
         energies: energies in eV to calculate cross-sections
         kind:     'photo' or 'total' (default) for whether to
                   return photo-absorption or total cross-section.
+        chunk_size, out:  if either is given, energies are evaluated in
+                  blocks of chunk_size, and written to the array out.
 
         Data from Elam, Ravel, and Sieber.
         """
-        calc = self.Elam_CrossSection
-        xsec = calc(element, energies, kind='photo')
-        if kind.lower().startswith('tot'):
-            xsec += calc(element, energies, kind='coh')
-            xsec += calc(element, energies, kind='incoh')
+        if chunk_size is None and out is None:
+            return self._mu_elam(element, energies, kind, self.dense)
+        if isinstance(element, int):
+            element = self.symbol(element)
+        dense = self._dense_for(element, energies)
+        return chunked(lambda e: self._mu_elam(element, e, kind, dense),
+                       [energies], chunk_size=chunk_size, out=out)
 
+    def _mu_elam(self, element, energies, kind, dense):
+        "mu_elam(), from dense if not None"
+        if isinstance(element, int):
+            element = self.symbol(element)
+        xsec = self._elam(element, energies, 'photo', dense)
+        if kind.lower().startswith('tot'):
+            xsec += self._elam(element, energies, 'coh', dense)
+            xsec += self._elam(element, energies, 'incoh', dense)
         return xsec
 
+    def _elam_tables(self, kind='photo'):
+        """return (ElamTables, dictionary of element symbol -> row) for
+        all elements with Elam data, read on first use"""
+        kind = _elam_kind(kind)
+        packed = self._elam_packed.get(kind, None)
+        if packed is None:
+            symbols, tables = [], []
+            for sym in self.element_symbols[1:]:
+                arrays = self._getElamArrays(sym, kind) if sym else None
+                if arrays is not None:
+                    symbols.append(sym)
+                    tables.append(arrays)
+            packed = (ElamTables(tables),
+                      dict((sym, i) for i, sym in enumerate(symbols)))
+            self._elam_packed[kind] = packed
+        return packed
+
+    def elam_cross_sections(self, elements=None, energies=10000.0,
+                            kinds=('photo', 'coh', 'incoh')):
+        """returns Elam cross-sections for several elements at once
+
+        arguments
+        ---------
+        elements: list of atomic numbers or symbols (default: all
+                  elements with Elam data, in order of atomic number)
+        energies: energy or array of energies in eV
+        kinds:    list of 'photo', 'coh', 'incoh'
+
+        returns dictionary of kind -> array of shape
+        (len(elements),) + energies.shape, in cm^2/gr.  Each row is
+        the same as Elam_CrossSection() for that element.
+        """
+        out = {}
+        for kind in kinds:
+            tables, rows = self._elam_tables(kind)
+            if elements is None:
+                index = np.arange(len(tables))
+            else:
+                index = []
+                for elem in elements:
+                    sym = self.symbol(elem)
+                    if sym not in rows:
+                        raise ValueError("no Elam data for '%s'" % elem)
+                    index.append(rows[sym])
+            out[kind] = tables.evaluate(energies, index)
+        return out
+
+    def mu_elam_matrix(self, elements=None, energies=10000.0, kind='total'):
+        """returns X-ray attenuation cross sections for several elements
+        at energies (in eV), as an array of shape
+        (len(elements),) + energies.shape, in cm^2/gr
+
+        arguments
+        ---------
+        elements: list of atomic numbers or symbols (default: all
+                  elements with Elam data, in order of atomic number)
+        energies: energy or array of energies in eV
+        kind:     'photo' or 'total' (default) for whether to
+                  return photo-absorption or total cross-section.
+
+        The mass attenuation of a compound is the product of its mass
+        fractions with this matrix.
+        """
+        if not kind.lower().startswith('tot'):
+            return self.elam_cross_sections(elements, energies,
+                                            ('photo',))['photo']
+        xsec = self.elam_cross_sections(elements, energies)
+        out = xsec['photo']
+        out += xsec['coh']
+        out += xsec['incoh']
+        return out
+
     def coherent_cross_section_elam(self, element, energies):
         """returns coherenet scattering cross section for an element
         at energies (in eV)
@@ -698,3 +2506,49 @@ class xrayDB(object):
         Data from Elam, Ravel, and Sieber.
         """
         return self.Elam_CrossSection(element, energies, kind='incoh')
+
+
+if __name__ == '__main__':
+    # compare the SQLAlchemy path with the preloaded in-memory tables
+    energies = np.linspace(1000, 100000, 1001)
+    elements = ('H', 'C', 'O', 'Si', 'Fe', 'Cu', 'Ag', 'Au', 'U')
+    binfile = make_binary_db(filename='xrayref_bench.bin')
+    for label, kws in (('sqlalchemy', {}), ('preload', {'preload': True}),
+                       ('binary', {'binary': binfile})):
+        t0 = time.time()
+        xdb = xrayDB(**kws)
+        t1 = time.time()
+        for _ in range(20):
+            for elem in elements:
+                xdb.f1_chantler(elem, energies)
+                xdb.f2_chantler(elem, energies)
+                xdb.mu_elam(elem, energies)
+                xdb.atomic_mass(elem)
+                xdb.xray_edges(elem)
+                xdb.f0(elem, energies/1.e5)
+        t2 = time.time()
+        print('%-10s: init %.3f s, lookups %.3f s' % (label,
+                                                    t1 - t0, t2 - t1))
+        xdb.close()
+    os.remove(binfile)
+
+    # dense energy grids: lookup time and accuracy against resolution
+    xdb = xrayDB(preload=True)
+    for ppd in (250, 1000, 4000):
+        t0 = time.time()
+        grid = xdb.use_dense_grid(points_per_decade=ppd)
+        t1 = time.time()
+        for _ in range(20):
+            for elem in elements:
+                xdb.f1_chantler(elem, energies)
+                xdb.f2_chantler(elem, energies)
+                xdb.mu_elam(elem, energies)
+        t2 = time.time()
+        worst = {}
+        for (elem, name), err in grid.est_error.items():
+            worst[name] = max(worst.get(name, 0), err)
+        print('dense grid, %d points/decade: init %.3f s, lookups %.3f s' %
+              (ppd, t1 - t0, t2 - t1))
+        print('   est. max relative error: ' + ', '.join(
+            '%s %.1e' % (name, err) for name, err in sorted(worst.items())))
+    xdb.close()
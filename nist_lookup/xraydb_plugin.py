@@ -1,9 +1,11 @@
 import sys
 from math import pi
 
+import numpy as np
+
 from nist_lookup.physical_constants import R_ELECTRON_CM, AVOGADRO, PLANCK_HC
 from nist_lookup.chemparser import chemparse
-from nist_lookup.xraydb import xrayDB
+from nist_lookup.xraydb import get_xraydb, chunked
 
 '''
 Functions for accessing and using data from X-ray Databases and
@@ -26,7 +28,7 @@ xray_lines      X-ray emission lines for an element
 '''
 
 
-def xray_line(element, line='Ka', xdb=xrayDB()):
+def xray_line(element, line='Ka', xdb=None):
     """returns data for an  x-ray emission lines of an element, given
     the siegbahn notation for the like (Ka1, Lb1, etc).  Returns:
          energy (in eV), intensity, initial_level, final_level
@@ -41,32 +43,13 @@ def xray_line(element, line='Ka', xdb=xrayDB()):
 
     Data from Elam, Ravel, and Sieber.
     """
-    lines = xdb.xray_lines(element)
-
-    family = line.lower()
-    if family == 'k':
-        family = 'ka'
-    if family == 'l':
-        family = 'la'
-    if family in ('ka', 'kb', 'la', 'lb', 'lg'):
-        scale = 1.e-99
-        value = 0.0
-        linit, lfinal = None, None
-        for key, val in lines.items():
-            if key.lower().startswith(family):
-                value += val[0]*val[1]
-                scale += val[1]
-                if linit is None:
-                    linit = val[2]
-                if lfinal is None:
-                    lfinal = val[3][0]
-        return (value/scale, scale, linit, lfinal)
-    else:
-        return lines.get(line.title(), None)
+    if xdb is None:
+        xdb = get_xraydb()
+    return xdb.line_index().line(element, line)
 
 
 def fluo_yield(symbol, edge, emission, energy,
-               energy_margin=-150, xdb=xrayDB()):
+               energy_margin=-150, xdb=None):
     """Given
          atomic_symbol, edge, emission family, and incident energy,
 
@@ -77,6 +60,9 @@ def fluo_yield(symbol, edge, emission, energy,
 
     fyield = 0  if energy < edge_energy + energy_margin (default=-150)
 
+    energy may be an array of incident energies, giving an array of
+    fluorescence yields.
+
     > fluo_yield('Fe', 'K', 'Ka', 8000)
     0.350985, 6400.752419799043, 0.874576096
 
@@ -91,48 +77,109 @@ def fluo_yield(symbol, edge, emission, energy,
 
     Adapted for Larch from code by Yong Choi
     """
-    e0, fyield, jump = xdb.xray_edge(symbol, edge)
-    trans = xdb.xray_lines(symbol, initial_level=edge)
-
-    lines = []
-    net_ener, net_prob = 0., 0.
-    for name, vals in trans.items():
-        en, prob = vals[0], vals[1]
-        if name.startswith(emission):
-            lines.append([name, en, prob])
-
-    for name, en, prob in lines:
-        if name.startswith(emission):
-            net_ener += en*prob
-            net_prob += prob
-    if net_prob <= 0:
-        net_prob = 1
-    net_ener = net_ener / net_prob
-    if energy < e0 + energy_margin:
+    if xdb is None:
+        xdb = get_xraydb()
+    index = xdb.line_index()
+    e0, fyield, jump = index.edge(symbol, edge)
+    net_ener, net_prob = index.net_emission(symbol, edge, emission)
+    if np.ndim(energy) > 0:
+        fyield = np.where(np.asarray(energy) < e0 + energy_margin,
+                          0.0, fyield)
+    elif energy < e0 + energy_margin:
         fyield = 0
     return fyield, net_ener, net_prob
 
 
+def fluo_yield_many(symbols, edges, emissions, energy,
+                    energy_margin=-150, xdb=None):
+    """fluo_yield() for many (element, edge, emission) combinations and
+    incident energies at once
+
+    arguments
+    ---------
+     symbols:        atomic symbols or numbers
+     edges:          absorption edges ('K', 'L3', ...)
+     emissions:      emission families ('Ka', 'Lb', ...)
+     energy:         incident energy or array of energies in eV
+     energy_margin:  as for fluo_yield() (default=-150)
+
+    symbols, edges and emissions may each be a single value or a
+    sequence, and are broadcast against each other to n combinations.
+
+    returns
+    -------
+     structured array of shape (n,), with fields 'yield' (fluorescence
+     yield, of shape energy.shape), 'energy' (weighted-average
+     fluorescence energy) and 'probability' (net probability), equal to
+     fluo_yield() of each combination.  An unknown edge raises a
+     ValueError.
+    """
+    if xdb is None:
+        xdb = get_xraydb()
+    index = xdb.line_index()
+    symbols, edges, emissions = [np.atleast_1d(a).ravel() for a in
+                                 np.broadcast_arrays(
+                                     np.asarray(symbols, dtype=object),
+                                     np.asarray(edges, dtype=object),
+                                     np.asarray(emissions, dtype=object))]
+    energy = np.asarray(energy, dtype=float)
+    n = len(symbols)
+
+    # (edge energy, yield, net energy, net probability) of each row,
+    # looking up the tables of each element once
+    groups = {}
+    for i, sym in enumerate(symbols):
+        groups.setdefault(index.symbol(sym), []).append(i)
+    rows = [None] * n
+    for sym, members in groups.items():
+        elem_edges = index.edges.get(sym, {})
+        elem_emission = index.emission.get(sym, {})
+        for i in members:
+            edge = edges[i].title()
+            if edge not in elem_edges:
+                raise ValueError("no %s edge for '%s'" % (edges[i], sym))
+            rows[i] = (elem_edges[edge][:2] +
+                       elem_emission.get((edge, emissions[i]), (0.0, 1)))
+    e0, fyield, net_ener, net_prob = np.array(rows, dtype=float).reshape(
+        n, 4).T
+
+    shape = (n,) + (1,) * energy.ndim
+    out = np.empty(n, dtype=[('yield', float, energy.shape),
+                             ('energy', float), ('probability', float)])
+    fyields = out['yield']
+    fyields[...] = fyield.reshape(shape)
+    np.copyto(fyields, 0.0,
+              where=energy < (e0 + energy_margin).reshape(shape))
+    out['energy'] = net_ener
+    out['probability'] = net_prob
+    return out
+
+
 class Scatterer:
     """Scattering Element
 
     lamb=PLANCK_HC /(eV0/1000.)*1e-11    # in cm, 1e-8cm = 1 Angstrom
     Xsection=2* R_ELECTRON_CM *lamb*f2/BARN    # in Barns/atom
     """
-    def __init__(self, symbol, energy=10000, xdb=xrayDB()):
+    def __init__(self, symbol, energy=10000, xdb=None, erange=None):
+        if xdb is None:
+            xdb = get_xraydb()
         # atomic symbol and incident x-ray energy (eV)
         self.symbol = symbol
         self.number = xdb.atomic_number(symbol)
         self.mass = xdb.atomic_mass(symbol)
-        self.f1 = xdb.chantler_data(symbol, energy, 'f1')
-        self.f1 = self.f1 + self.number
-        self.f2 = xdb.chantler_data(symbol, energy, 'f2')
-        self.mu_photo = xdb.chantler_data(symbol, energy, 'mu_photo')
-        self.mu_total = xdb.chantler_data(symbol, energy, 'mu_total')
+        data = xdb.chantler_columns(symbol, energy,
+                                    ('f1', 'f2', 'mu_photo', 'mu_total'),
+                                    erange=erange)
+        self.f1 = data['f1'] + self.number
+        self.f2 = data['f2']
+        self.mu_photo = data['mu_photo']
+        self.mu_total = data['mu_total']
 
 
 def xray_delta_beta(material, density, energy,
-                    photo_only=False, xdb=xrayDB()):
+                    photo_only=False, xdb=None, chunk_size=None, out=None,
+                    cache=None):
     """
     return anomalous components of the index of refraction for a material,
     using the tabulated scattering components from Chantler.
@@ -140,14 +187,26 @@ def xray_delta_beta(material, density, energy,
     arguments:
     ----------
        material:   chemical formula  ('Fe2O3', 'CaMg(CO3)2', 'La1.9Sr0.1CuO4')
-       density:    material density in g/cm^3
-       energy:     x-ray energy in eV
+       density:    material density in g/cm^3, scalar or array
+       energy:     x-ray energy in eV, scalar or array
        photo_only: boolean for returning photo cross-section component only
                    if False (default), the total cross-section is returned
     returns:
     ---------
       (delta, beta, atlen)
 
+    density and energy are broadcast against each other, the returned
+    values have the broadcast shape.  Each element of the material is
+    looked up once for all energies.
+
+    with chunk_size or out given, energies are evaluated in blocks of
+    chunk_size, and written to out, a tuple of 3 arrays, so that memory
+    use does not grow with the number of energies.  The results are the
+    same as for all energies at once.
+
+    with cache, a ResultCache (see nist_lookup.result_cache), results are
+    read from the cache when stored there, and stored otherwise.
+
     where
       delta :  real part of index of refraction
       beta  :  imag part of index of refraction
@@ -159,27 +218,73 @@ def xray_delta_beta(material, density, energy,
 
     Adapted for Larch from code by Yong Choi
     """
-    lamb_cm = 1.e-8 * PLANCK_HC / energy  # lambda in cm
+    if cache is not None:
+        if xdb is None:
+            xdb = get_xraydb()
+        return cache.cached(
+            xdb, 'xray_delta_beta', (material, density, energy, photo_only),
+            lambda: xray_delta_beta(material, density, energy, photo_only,
+                                    xdb, chunk_size, out), out=out)
+    evaluate = _delta_beta_func(material, photo_only, xdb,
+                                (np.min(energy), np.max(energy)))
+    if chunk_size is not None or out is not None:
+        return chunked(evaluate, [energy, density], chunk_size=chunk_size,
+                       out=out)
+    return evaluate(energy, density)
+
+
+def _delta_beta_func(material, photo_only, xdb, erange):
+    """function of (energy, density) giving xray_delta_beta() for energies
+    within erange = (emin, emax).  The formula is parsed and the tables of
+    its elements are looked up once, not at each call."""
+    if xdb is None:
+        xdb = get_xraydb()
     elements = []
     for symbol, number in chemparse(material).items():
-        elements.append((number, Scatterer(symbol, energy, xdb)))
-
-    total_mass, delta, beta_photo, beta_total = 0, 0, 0, 0
-    for (number, scat) in elements:
-        weight = density*number*AVOGADRO
-        delta += weight * scat.f1
-        beta_photo += weight * scat.f2
-        beta_total += weight * scat.f2*(scat.mu_total/scat.mu_photo)
-        total_mass += number * scat.mass
-
-    scale = lamb_cm * lamb_cm * R_ELECTRON_CM / (2*pi * total_mass)
-    delta = delta * scale
-    beta = beta_total * scale
-    if photo_only:
-        beta = beta_photo * scale
-    return delta, beta, lamb_cm/(4*pi*beta)
+        elements.append((number, xdb.atomic_number(symbol),
+                         xdb.atomic_mass(symbol),
+                         xdb._chantler_columns_func(
+                             symbol, ('f1', 'f2', 'mu_photo', 'mu_total'),
+                             erange)))
+
+    def evaluate(energy, density):
+        energy = np.asarray(energy, dtype=float)
+        density = np.asarray(density, dtype=float)
+        lamb_cm = 1.e-8 * PLANCK_HC / energy  # lambda in cm
+
+        total_mass, delta, beta_photo, beta_total = 0, 0, 0, 0
+        for number, z, mass, columns in elements:
+            dat = columns(energy)
+            weight = density*number*AVOGADRO
+            delta += weight * (dat['f1'] + z)
+            beta_photo += weight * dat['f2']
+            beta_total += weight * dat['f2']*(dat['mu_total']/dat['mu_photo'])
+            total_mass += number * mass
+
+        scale = lamb_cm * lamb_cm * R_ELECTRON_CM / (2*pi * total_mass)
+        delta = delta * scale
+        beta = beta_total * scale
+        if photo_only:
+            beta = beta_photo * scale
+        return delta, beta, lamb_cm/(4*pi*beta)
+    return evaluate
 
 if __name__ == '__main__':
+    import subprocess
+    import time
+    # import time and first-call time, each in a fresh interpreter
+    for label, code in (
+            ('import', 'import nist_lookup.xraydb_plugin'),
+            ('import + mu_elam',
+             'import nist_lookup.xraydb_plugin as x; '
+             'x.get_xraydb().mu_elam("Fe", 1e4)'),
+            ('import + xray_delta_beta',
+             'import nist_lookup.xraydb_plugin as x; '
+             'x.xray_delta_beta("Fe2O3", 11, 1e4)')):
+        t0 = time.time()
+        subprocess.check_call([sys.executable, '-c', code])
+        print('%-26s %.3f s' % (label, time.time() - t0))
+
     print(xray_delta_beta('Fe2O3', 11, 1e4))
     import cProfile
     cProfile.run(
@@ -0,0 +1,36 @@
+import os
+
+import pytest
+
+from nist_lookup import materials
+from nist_lookup.xraydb import xrayDB
+
+
+@pytest.fixture(scope='session')
+def xdb():
+    "preloaded xrayDB shared by all tests, which must not modify it"
+    return xrayDB(preload=True)
+
+
+@pytest.fixture(scope='session')
+def plain():
+    "xrayDB without preloading, reading the tables through SQL queries"
+    return xrayDB()
+
+
+@pytest.fixture(scope='session', autouse=True)
+def user_home(tmp_path_factory):
+    """keep the tests away from ~/.nist_lookup: the user materials file,
+    also that of worker processes, is in a temporary home directory"""
+    home = tmp_path_factory.mktemp('home')
+    old_home = os.environ.get('HOME')
+    os.environ['HOME'] = str(home)
+    materials.set_materials_files(
+        (materials.BUNDLED_MATERIALS,
+         str(home / '.nist_lookup' / 'materials.dat')))
+    yield home
+    if old_home is None:
+        del os.environ['HOME']
+    else:
+        os.environ['HOME'] = old_home
+    materials.set_materials_files()
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+
+
+def test_scalar_against_elements_table(xdb):
+    for row in xdb.store.elements.values():
+        assert xdb.atomic_number(row.element) == row.atomic_number
+        assert xdb.atomic_number(row.element.lower()) == row.atomic_number
+        assert xdb.atomic_symbol(row.atomic_number) == row.element
+        assert xdb.atomic_mass(row.element) == row.molar_mass
+        assert xdb.atomic_mass(row.atomic_number) == row.molar_mass
+        assert xdb.atomic_density(row.element) == row.density
+        assert xdb.atomic_density(row.atomic_number) == row.density
+
+
+def test_arrays_against_scalar(xdb):
+    symbols = [row.element for row in xdb.store.elements.values()]
+    symbols = np.array(symbols + symbols[::-1]).reshape(-1, 2)
+    zs = xdb.atomic_numbers(symbols)
+    assert zs.shape == symbols.shape
+    assert zs.tolist() == [[xdb.atomic_number(s) for s in pair]
+                           for pair in symbols]
+    assert np.array_equal(xdb.atomic_symbols(zs), symbols)
+    for elements in (symbols, zs):
+        masses = xdb.atomic_masses(elements)
+        densities = xdb.atomic_densities(elements)
+        assert masses.shape == densities.shape == symbols.shape
+        for i, elem in np.ndenumerate(symbols):
+            assert masses[i] == xdb.atomic_mass(elem)
+            assert densities[i] == xdb.atomic_density(elem)
+    assert xdb.atomic_masses(['Fe']).tolist() == [xdb.atomic_mass('Fe')]
+
+
+@pytest.mark.parametrize('element', ['Xx', 'Fe2', '', 0, -1, 1000])
+def test_unknown_element(xdb, element):
+    with pytest.raises(ValueError):
+        xdb.atomic_number(element)
+    with pytest.raises(ValueError):
+        xdb.atomic_mass(element)
+    with pytest.raises(ValueError):
+        xdb.atomic_density(element)
+    for func in (xdb.atomic_numbers, xdb.atomic_masses,
+                 xdb.atomic_densities):
+        with pytest.raises(ValueError):
+            func(['Fe', element] if isinstance(element, str)
+                 else [26, element])
+    if not isinstance(element, str):
+        with pytest.raises(ValueError):
+            xdb.atomic_symbol(element)
+        with pytest.raises(ValueError):
+            xdb.atomic_symbols([26, element])
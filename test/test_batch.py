@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from nist_lookup.batch import batch_delta_beta, batch_material_mu
+from nist_lookup.materials import material_mu
+from nist_lookup.xraydb_plugin import xray_delta_beta
+
+ENERGIES = np.geomspace(2000.0, 60000.0, 201)
+JOBS = [('SiO2', 2.2, ENERGIES), ('Au', 19.3, ENERGIES),
+        ('water', None, ENERGIES), ('Fe2O3', 5.2, ENERGIES),
+        ('SiO2', 2.6, ENERGIES)]
+
+
+def test_delta_beta_serial():
+    delta, beta, atlen = batch_delta_beta(JOBS, max_workers=1)
+    assert delta.shape == (len(JOBS), len(ENERGIES))
+    for i, (material, density, energy) in enumerate(JOBS):
+        if density is None:
+            material, density = 'H2O', 1.0
+        expected = xray_delta_beta(material, density, energy)
+        for res, exp in zip((delta[i], beta[i], atlen[i]), expected):
+            assert np.array_equal(res, exp)
+
+
+def test_mu_serial():
+    mu = batch_material_mu(JOBS, max_workers=1)
+    assert mu.shape == (len(JOBS), len(ENERGIES))
+    for row, (material, density, energy) in zip(mu, JOBS):
+        assert np.array_equal(row, material_mu(material, energy, density))
+
+
+def test_workers_same_as_serial():
+    serial = batch_delta_beta(JOBS, max_workers=1)
+    pooled = batch_delta_beta(JOBS, max_workers=2, chunksize=2)
+    for res, exp in zip(pooled, serial):
+        assert np.array_equal(res, exp)
+    assert np.array_equal(batch_material_mu(JOBS, max_workers=2),
+                          batch_material_mu(JOBS, max_workers=1))
+
+
+def test_mixed_shapes():
+    jobs = [('SiO2', 2.2, ENERGIES), ('Au', 19.3, 8000.0)]
+    mu = batch_material_mu(jobs, max_workers=1)
+    assert isinstance(mu, list)
+    assert mu[0].shape == ENERGIES.shape and mu[1].shape == ()
+    delta, beta, atlen = batch_delta_beta(jobs, max_workers=1)
+    assert isinstance(delta, list) and delta[1].shape == ()
+
+
+def test_unknown_material_needs_density():
+    with pytest.raises(Warning):
+        batch_material_mu([('SiO2', None, ENERGIES)], max_workers=1)
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_mu_without_chantler_data(workers):
+    # Pu has Elam but no Chantler data
+    jobs = [('PuO2', 11.5, ENERGIES), ('SiO2', 2.2, ENERGIES),
+            ('UO2', 10.97, ENERGIES)]
+    mu = batch_material_mu(jobs, max_workers=workers)
+    for row, (material, density, energy) in zip(mu, jobs):
+        assert np.array_equal(row, material_mu(material, energy, density))
+    with pytest.raises(ValueError):
+        batch_delta_beta(jobs, max_workers=workers)
@@ -0,0 +1,77 @@
+import shutil
+import sqlite3
+
+import numpy as np
+import pytest
+
+from nist_lookup import xraydb
+from nist_lookup.xraydb import xrayDB, make_binary_db, TableStore
+
+
+@pytest.fixture(scope='module')
+def binfile(tmp_path_factory):
+    return make_binary_db(filename=str(tmp_path_factory.mktemp('bin')
+                                       / 'xrayref.bin'))
+
+
+def test_no_connection(binfile):
+    xdb = xrayDB(binary=binfile)
+    xdb.f1_chantler('Fe', 8000.0)
+    xdb.xray_edges('Au')
+    xdb.mu_elam('Cu', [5000.0, 20000.0])
+    assert xdb._session is None
+    assert xdb._engine is None
+
+
+@pytest.mark.parametrize('element', ['H', 'Fe', 'Au', 'U'])
+def test_same_as_preload(binfile, xdb, element):
+    binary = xrayDB(binary=binfile)
+    energy = np.geomspace(1000.0, 90000.0, 301)
+    for name in ('f1_chantler', 'f2_chantler', 'mu_chantler', 'mu_elam'):
+        expected = getattr(xdb, name)(element, energy)
+        assert np.array_equal(getattr(binary, name)(element, energy),
+                              expected)
+    assert binary.xray_edges(element) == xdb.xray_edges(element)
+    assert binary.xray_lines(element) == xdb.xray_lines(element)
+    assert binary.f0(element, 0.5) == xdb.f0(element, 0.5)
+    assert binary.corehole_width(element) == xdb.corehole_width(element)
+
+
+def test_query_connects(binfile):
+    from nist_lookup.xraydb import ElementsTable
+    xdb = xrayDB(binary=binfile)
+    try:
+        assert xdb.query(ElementsTable).count() == 98
+        assert xdb._session is not None
+    finally:
+        xdb.close()
+
+
+def test_changed_database(tmp_path, xdb):
+    dbname = str(tmp_path / 'xrayref.db')
+    shutil.copy(xdb.dbname, dbname)
+    binfile = make_binary_db(dbname)
+    assert binfile == str(tmp_path / 'xrayref.bin')
+    xrayDB(dbname, binary=binfile).f1_chantler('Fe', 8000.0)
+
+    with sqlite3.connect(dbname) as conn:
+        conn.execute('PRAGMA user_version = 7')
+    with pytest.raises(ValueError, match='different database'):
+        xrayDB(dbname, binary=binfile)
+    with pytest.raises(ValueError, match='different database'):
+        TableStore.load_binary(binfile,
+                               source_checksum=xrayDB(dbname).checksum())
+    TableStore.load_binary(binfile, source_checksum=xdb.checksum())
+    # without the database to compare with, the file is used as it is
+    TableStore.load_binary(binfile)
+    make_binary_db(dbname)
+    xrayDB(dbname, binary=binfile).f1_chantler('Fe', 8000.0)
+
+
+def test_old_version(tmp_path, xdb, monkeypatch):
+    binfile = str(tmp_path / 'old.bin')
+    monkeypatch.setattr(xraydb, 'BINARY_VERSION', 1)
+    xdb.store.save_binary(binfile)
+    monkeypatch.undo()
+    with pytest.raises(ValueError, match='version 1'):
+        TableStore.load_binary(binfile)
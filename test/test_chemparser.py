@@ -0,0 +1,62 @@
+import random
+
+import numpy as np
+import pytest
+
+from nist_lookup.chemparser import (ELEMENTS, ChemFormulaParser, chemparse,
+                                    chemparse_many)
+
+
+def test_many_non_strings():
+    errors = []
+    out = list(chemparse_many(['H2O', None, 3.0, 'SiO2'], errors=errors))
+    assert out == [{'H': 2.0, 'O': 1}, None, None, {'Si': 1, 'O': 2.0}]
+    assert [(i, f) for i, f, msg in errors] == [(1, None), (2, 3.0)]
+
+
+def test_many_matrix_errors():
+    errors = []
+    mat = chemparse_many(['H2O', 'co', ['H2O']], errors=errors, matrix=True)
+    assert mat.shape[0] == 3
+    assert np.isfinite(mat[0]).all()
+    assert np.isnan(mat[1:]).all()
+    assert [i for i, f, msg in errors] == [1, 2]
+
+
+def random_formula(rng, depth=0):
+    out = []
+    for _ in range(rng.randint(1, 4)):
+        if depth < 2 and rng.random() < 0.25:
+            out.append('(%s)' % random_formula(rng, depth+1))
+        else:
+            out.append(rng.choice(sorted(ELEMENTS)))
+        if rng.random() < 0.6:
+            out.append(rng.choice(('2', '3', '0.5', '1.e-3', '12')))
+    return ''.join(out)
+
+
+def test_same_as_parser_class():
+    rng = random.Random(0)
+    parser = ChemFormulaParser()
+    for _ in range(2000):
+        formula = random_formula(rng)
+        assert chemparse(formula) == parser.parse(formula)
+
+
+@pytest.mark.parametrize('formula', ['co', 'H2O)', '(H2O', 'Fe2Xx', 'H2 O'])
+def test_same_errors_as_parser_class(formula):
+    with pytest.raises(ValueError) as expected:
+        ChemFormulaParser().parse(formula)
+    with pytest.raises(ValueError) as result:
+        chemparse(formula)
+    assert str(result.value) == str(expected.value)
+
+
+def test_results_are_new_dicts():
+    comp = chemparse('H2O')
+    comp['H'] = 3
+    comp |= {'C': 1}
+    assert chemparse('H2O') == {'H': 2.0, 'O': 1}
+    first, second = chemparse_many(['SiO2', 'SiO2'])
+    first.clear()
+    assert second == {'Si': 1, 'O': 2.0}
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+from nist_lookup.xraydb_plugin import xray_delta_beta
+
+
+@pytest.mark.parametrize('material', ['SiO2', 'La1.9Sr0.1CuO4', 'Au'])
+def test_chunked_same(plain, material):
+    energy = np.geomspace(1200.0, 90000.0, 5001)
+    density = np.linspace(1.0, 20.0, 5001)
+    expected = xray_delta_beta(material, density, energy, xdb=plain)
+    out = tuple(np.empty(5001) for _ in range(3))
+    result = xray_delta_beta(material, density, energy, xdb=plain,
+                             chunk_size=777, out=out)
+    assert result is out
+    for exp, res in zip(expected, result):
+        assert np.array_equal(exp, res)
+
+
+def test_chunked_looks_up_once(plain, monkeypatch):
+    calls = []
+    lookup = plain._getChantlerArrays
+    monkeypatch.setattr(plain, '_getChantlerArrays',
+                        lambda *args: calls.append(args) or lookup(*args))
+    energy = np.geomspace(1200.0, 90000.0, 10000)
+    xray_delta_beta('Fe2O3', 5.2, energy, xdb=plain, chunk_size=100)
+    # one lookup of the columns per element, not one per block
+    assert sorted(elem for elem, cols in calls if 'f1' in cols) == ['Fe', 'O']
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from nist_lookup.xraydb import xrayDB, elam_cross_section
+
+ELEMENTS = ('Si', 'Fe', 'Au', 'U')
+# est_error is sampled midway between grid points and next to the table
+# energies; it is documented to be within a few percent of the true maximum
+TOLERANCE = 1.05
+
+
+@pytest.fixture(scope='module')
+def dense():
+    xdb = xrayDB(preload=True)
+    xdb.use_dense_grid(emin=2000.0, emax=60000.0, elements=ELEMENTS)
+    return xdb
+
+
+def energies(n=4000, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.sort(np.exp(rng.uniform(np.log(2000.0), np.log(60000.0), n)))
+
+
+@pytest.mark.parametrize('element', ELEMENTS)
+def test_est_error_bounds_deviation(xdb, dense, element):
+    energy = energies()
+    est_error = dense.dense.est_error
+    for name, func in (('f2', 'f2_chantler'), ('mu_total', 'mu_chantler')):
+        approx = getattr(dense, func)(element, energy)
+        ref = getattr(xdb, func)(element, energy)
+        err = np.abs(approx / ref - 1)
+        assert err.max() <= TOLERANCE * est_error[(element, name)]
+    for kind in ('photo', 'coh', 'incoh'):
+        approx = dense.dense.elam(element, energy, kind)
+        ref = elam_cross_section(*xdb._getElamArrays(element, kind),
+                                 energy)
+        assert (np.abs(approx / ref - 1).max() <=
+                TOLERANCE * est_error[(element, 'elam_' + kind)])
+
+
+@pytest.mark.parametrize('element', ELEMENTS)
+def test_f1_against_windowed_reference(xdb, dense, element):
+    # the f1 reference is the spline of the window around each energy
+    energy = energies(300, seed=1)
+    z = xdb.atomic_number(element)
+    ref = np.array([xdb.f1_chantler(element, e) for e in energy])
+    err = np.abs(dense.f1_chantler(element, energy) - ref) / z
+    assert err.max() <= TOLERANCE * dense.dense.est_error[(element, 'f1')]
+
+
+def test_reported_errors(dense):
+    # f1 relative to Z, the others relative to their value
+    for (element, name), err in dense.dense.est_error.items():
+        assert err < (0.05 if name == 'f1' else 0.02), (element, name, err)
+
+
+def test_outside_grid_is_exact(xdb, dense):
+    for energy in (np.geomspace(500.0, 1900.0, 50),
+                   np.geomspace(1000.0, 90000.0, 50), 70000.0):
+        for func in ('f1_chantler', 'f2_chantler', 'mu_chantler'):
+            assert np.array_equal(getattr(dense, func)('Fe', energy),
+                                  getattr(xdb, func)('Fe', energy))
+    # elements not on the grid
+    energy = energies(100)
+    assert np.array_equal(dense.f2_chantler('Cu', energy),
+                          xdb.f2_chantler('Cu', energy))
+
+
+def test_switch_off():
+    xdb = xrayDB(preload=True)
+    energy = energies(100)
+    ref = xdb.mu_chantler('Fe', energy)
+    xdb.use_dense_grid(emin=2000.0, emax=60000.0, elements=['Fe'])
+    assert not np.array_equal(xdb.mu_chantler('Fe', energy), ref)
+    xdb.use_dense_grid(None)
+    assert np.array_equal(xdb.mu_chantler('Fe', energy), ref)
+
+
+def test_chunked_same(dense):
+    energy = energies()
+    expected = dense.chantler_columns('Au', energy)
+    result = dense.chantler_columns('Au', energy, chunk_size=333)
+    for col, val in expected.items():
+        assert np.array_equal(result[col], val)
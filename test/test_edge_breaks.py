@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+
+
+def plain_interp(te, ty, energy):
+    "log-log interpolation of a table, not split at edges"
+    with np.errstate(divide='ignore'):
+        return np.exp(np.interp(np.log(energy), np.log(te), np.log(ty)))
+
+
+def test_au_m5_m4_steps(xdb):
+    # M5 (2206 eV) and M4 (2291 eV) are 4% apart, and each has its own
+    # step in the table: [2203.5, 2216.7] and [2288.8, 2302.6]
+    te, f2 = xdb._getChantlerArrays('Au', ('energy', 'f2'))
+    breaks = xdb.chantler_breaks('Au')
+    assert 2206.0 in breaks
+    assert 2291.0 in breaks
+    pre_m5 = f2[np.searchsorted(te, 2206.0) - 1]
+    post_m5 = f2[np.searchsorted(te, 2206.0)]
+    post_m4 = f2[np.searchsorted(te, 2291.0)]
+    val = xdb.f2_chantler('Au', np.array([2204.0, 2210.0, 2216.5, 2295.0]))
+    assert abs(val[0] / pre_m5 - 1) < 0.01
+    assert val[1] > 0.9 * post_m5
+    assert val[2] > 0.9 * post_m5
+    assert val[3] > 0.9 * post_m4
+
+
+@pytest.mark.parametrize('elem', ['Au', 'Pb', 'U', 'Fe', 'Mg', 'Ag'])
+def test_one_break_per_interval(xdb, elem):
+    te, = xdb._getChantlerArrays(elem, ('energy',))
+    breaks = xdb.chantler_breaks(elem)
+    intervals = np.searchsorted(te, breaks, side='right') - 1
+    assert len(set(intervals)) == len(breaks)
+    # every break is within one table point of an edge
+    edges = np.array([e[0] for e in xdb.xray_edges(elem).values()])
+    kedges = np.searchsorted(te, edges, side='right') - 1
+    for k in intervals:
+        assert np.min(np.abs(kedges - k)) <= 1
+
+
+@pytest.mark.parametrize('elem', ['Au', 'Fe', 'Mg'])
+def test_unchanged_away_from_edges(xdb, elem):
+    te, f2, incoh = xdb._getChantlerArrays(elem, ('energy', 'f2',
+                                                  'mu_incoh'))
+    energy = np.geomspace(1100, 90000, 4001)
+    kbreak = np.searchsorted(te, xdb.chantler_breaks(elem), 'right') - 1
+    keep = np.ones(len(energy), dtype=bool)
+    for k in kbreak:
+        keep &= ~((energy > te[k]) & (energy < te[k+1]))
+    got = xdb.chantler_columns(elem, energy, ('f2', 'mu_incoh'),
+                               fit='full')
+    ref_f2 = plain_interp(te, f2, energy)
+    np.testing.assert_allclose(got['f2'][keep], ref_f2[keep], rtol=1e-12)
+    # mu_incoh has no edges and is never split
+    np.testing.assert_allclose(got['mu_incoh'],
+                               plain_interp(te, incoh, energy), rtol=1e-12)
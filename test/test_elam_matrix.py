@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+
+ENERGIES = np.geomspace(500.0, 500000.0, 601)
+
+
+def elam_elements(xdb):
+    "symbols of all elements with Elam data, in order of atomic number"
+    return [sym for sym in xdb.element_symbols[1:]
+            if sym and xdb._getElamArrays(sym, 'photo') is not None]
+
+
+def test_elam_cross_sections(xdb):
+    elements = elam_elements(xdb)
+    out = xdb.elam_cross_sections(energies=ENERGIES)
+    assert sorted(out) == ['coh', 'incoh', 'photo']
+    for kind, matrix in out.items():
+        assert matrix.shape == (len(elements), len(ENERGIES))
+        for elem, row in zip(elements, matrix):
+            assert np.array_equal(
+                row, xdb.Elam_CrossSection(elem, ENERGIES, kind)), (elem,
+                                                                   kind)
+
+
+@pytest.mark.parametrize('kind', ['total', 'photo'])
+def test_mu_elam_matrix(xdb, kind):
+    elements = elam_elements(xdb)
+    matrix = xdb.mu_elam_matrix(energies=ENERGIES, kind=kind)
+    assert matrix.shape == (len(elements), len(ENERGIES))
+    for elem, row in zip(elements, matrix):
+        assert np.array_equal(row, xdb.mu_elam(elem, ENERGIES, kind)), elem
+
+
+def test_subsets_and_shapes(xdb):
+    energy = ENERGIES[:60].reshape(3, 20)
+    elements = ['U', 26, 'o', 'Fe']
+    matrix = xdb.mu_elam_matrix(elements, energy)
+    assert matrix.shape == (4, 3, 20)
+    for elem, row in zip(elements, matrix):
+        assert np.array_equal(row, xdb.mu_elam(elem, energy))
+    xsec = xdb.elam_cross_sections(elements, 8000.0, kinds=['coh'])
+    assert list(xsec) == ['coh']
+    assert np.array_equal(xsec['coh'].ravel(), [
+        xdb.Elam_CrossSection(elem, 8000.0, 'coh') for elem in elements])
+    with pytest.raises(ValueError):
+        xdb.mu_elam_matrix(['Fe', 'Xx'], energy)
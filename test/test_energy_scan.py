@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+
+ELEMENTS = ['H', 'O', 'Fe', 'Au', 'U', 'Pu']
+ENERGIES = [np.linspace(7000.0, 7500.0, 501),
+            np.geomspace(1000.0, 100000.0, 400),
+            11919.0]
+
+
+def same(a, b):
+    "the scan gives the same values, bit for bit, as the xrayDB methods"
+    if a is None or b is None:
+        return a is None and b is None
+    return np.shape(a) == np.shape(b) and np.array_equal(a, b)
+
+
+@pytest.mark.parametrize('fit', ['window', 'full'])
+@pytest.mark.parametrize('energy', ENERGIES)
+def test_chantler_same_as_xraydb(xdb, energy, fit):
+    scan = xdb.energy_scan(energy, ELEMENTS, fit=fit)
+    for elem in ELEMENTS:
+        assert same(scan.f1_chantler(elem),
+                    xdb.f1_chantler(elem, energy, fit=fit)), elem
+        assert same(scan.f2_chantler(elem), xdb.f2_chantler(elem, energy))
+        for kws in ({}, {'photo': True}, {'incoh': True}):
+            assert same(scan.mu_chantler(elem, **kws),
+                        xdb.mu_chantler(elem, energy, **kws)), (elem, kws)
+        for column in ('f1', 'f2', 'mu_photo', 'mu_incoh', 'mu_total'):
+            assert same(scan.chantler(elem, column),
+                        xdb._getChantler(elem, energy, column=column,
+                                         fit=fit)), (elem, column)
+
+
+@pytest.mark.parametrize('energy', ENERGIES)
+def test_elam_same_as_xraydb(xdb, energy):
+    scan = xdb.energy_scan(energy, ELEMENTS)
+    for elem in ELEMENTS:
+        for kind in ('photo', 'coh', 'incoh'):
+            assert same(scan.Elam_CrossSection(elem, kind),
+                        xdb.Elam_CrossSection(elem, energy, kind)), (elem,
+                                                                     kind)
+        for kind in ('total', 'photo'):
+            assert same(scan.mu_elam(elem, kind),
+                        xdb.mu_elam(elem, energy, kind)), (elem, kind)
+
+
+def test_elements_by_number(xdb):
+    energy = ENERGIES[0]
+    scan = xdb.energy_scan(energy, [26, 'o'])
+    assert np.array_equal(scan.mu_chantler(26), scan.mu_chantler('Fe'))
+    assert np.array_equal(scan.mu_elam('O'), scan.mu_elam(8))
+    with pytest.raises(ValueError):
+        scan.f1_chantler('Cu')
+    with pytest.raises(ValueError):
+        scan.mu_elam(29)
@@ -0,0 +1,41 @@
+import json
+
+import numpy as np
+import pytest
+
+from nist_lookup.xraydb import WaasmaierTable
+
+Q = np.linspace(0.0, 2.0, 101)
+
+
+def test_f0_many_same_as_f0(xdb):
+    ions = xdb.f0_ions()
+    out = xdb.f0_many(q=Q)
+    assert out.shape == (len(ions), len(Q))
+    assert np.array_equal(xdb.f0_many(ions, Q), out)
+    for row, ion in zip(out, ions):
+        assert np.array_equal(row, xdb.f0(ion, Q)), ion
+
+
+def test_f0_against_table(xdb):
+    # the sum of the Gaussians in table order, as f0() always computed it
+    for row in xdb.query(WaasmaierTable).all():
+        f0 = row.offset
+        for s, e in zip(json.loads(row.scale), json.loads(row.exponents)):
+            f0 += s * np.exp(-e*Q*Q)
+        assert np.array_equal(xdb.f0(row.ion, Q), f0), row.ion
+
+
+def test_f0_many_shapes(xdb):
+    q = Q.reshape(-1, 1)[:10] + Q[:3]
+    ions = [26, 'fe', 'Fe2+', 'O2-']
+    out = xdb.f0_many(ions, q)
+    assert out.shape == (4,) + q.shape
+    for row, ion in zip(out, ions):
+        assert np.array_equal(row, xdb.f0(ion, q))
+    # a scalar q is taken as an array of one, as in f0()
+    out = xdb.f0_many(ions, 0.5)
+    assert out.shape == (4, 1)
+    assert np.array_equal(out[:, 0], [xdb.f0(ion, 0.5)[0] for ion in ions])
+    with pytest.raises(ValueError):
+        xdb.f0_many(['Fe', 'Xx'], Q)
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+from scipy.interpolate import UnivariateSpline
+
+from nist_lookup.xraydb import xrayDB, chantler_window
+
+
+@pytest.mark.parametrize('element', ['H', 'Si', 'Fe', 'Sm', 'Au', 'U'])
+def test_same_as_univariate_spline(xdb, element):
+    te, f1 = xdb._getChantlerArrays(element, ('energy', 'f1'))
+    for emin, emax in ((1000.0, 1100.0), (5000.0, 30000.0), (200.0, 90000.0)):
+        energy = np.geomspace(emin, emax, 301)
+        lo, hi = chantler_window(te, (emin, emax))
+        spline = UnivariateSpline(te[lo:hi], f1[lo:hi], s=1)
+        assert np.array_equal(xdb.f1_chantler(element, energy),
+                              spline(energy))
+    spline = UnivariateSpline(te, f1, s=1)
+    assert np.array_equal(xdb.f1_chantler(element, energy, fit='full'),
+                          spline(energy))
+
+
+def test_cache_file(tmp_path):
+    fname = str(tmp_path / 'splines.npz')
+    energy = np.geomspace(2000.0, 20000.0, 101)
+    xdb = xrayDB(preload=True, spline_cache_file=fname)
+    expected = dict((elem, xdb.f1_chantler(elem, energy))
+                    for elem in ('Fe', 'Au'))
+    xdb.spline_cache.save()
+    other = xrayDB(preload=True, spline_cache_file=fname)
+    assert len(other.spline_cache) == 2
+    for elem, val in expected.items():
+        assert np.array_equal(other.f1_chantler(elem, energy), val)
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from nist_lookup.xraydb import CosterKronigTable, KeskiRahkonenKrauseTable
+
+
+def ck_rows(xdb):
+    "{(element, initial, final): (partial, total)}, first row of each"
+    rows = {}
+    for r in xdb.query(CosterKronigTable).all():
+        rows.setdefault((r.element, r.initial_level, r.final_level),
+                        (r.transition_probability,
+                         r.total_transition_probability))
+    return rows
+
+
+def as_value(value):
+    return np.nan if value is None else value
+
+
+@pytest.mark.parametrize('db', ['xdb', 'plain'])
+def test_ck_probability_against_table(db, request):
+    xdb = request.getfixturevalue(db)
+    rows = ck_rows(xdb)
+    assert len(rows) > 0
+    for (elem, initial, final), (partial, total) in rows.items():
+        assert xdb.CK_probability(elem, initial, final) == total
+        assert xdb.CK_probability(elem.lower(), initial.lower(), final,
+                                  total=False) == partial
+        assert xdb.CK_probability(xdb.atomic_number(elem), initial,
+                                  final) == total
+    assert xdb.CK_probability('Fe', 'L1', 'K') is None
+    assert xdb.CK_probability('Fe', 'L1', 'X9') is None
+
+
+def test_ck_probability_arrays(xdb):
+    levels = np.array(xdb.level_tables().levels + ('X9',), dtype=object)
+    elements = sorted(set(elem for elem, _, _ in ck_rows(xdb)))
+    for elem in elements:
+        for total in (True, False):
+            out = xdb.CK_probability(elem, levels[:, None], levels[None, :],
+                                     total=total)
+            assert out.shape == (len(levels), len(levels))
+            expected = [[as_value(xdb.CK_probability(elem, i, f, total))
+                         for f in levels] for i in levels]
+            assert np.array_equal(out, expected, equal_nan=True), elem
+    out = xdb.CK_probability('Au', ['L1', 'L2', 'L1'], ['L3', 'L3', 'M5'])
+    assert np.array_equal(out, [as_value(xdb.CK_probability('Au', i, f))
+                                for i, f in (('L1', 'L3'), ('L2', 'L3'),
+                                             ('L1', 'M5'))],
+                          equal_nan=True)
+
+
+@pytest.mark.parametrize('db', ['xdb', 'plain'])
+def test_corehole_width_against_table(db, request):
+    xdb = request.getfixturevalue(db)
+    seen = set()
+    for r in xdb.query(KeskiRahkonenKrauseTable).all():
+        if (r.atomic_number, r.edge) in seen:
+            continue
+        seen.add((r.atomic_number, r.edge))
+        assert xdb.corehole_width(r.element, r.edge) == r.width
+        assert xdb.corehole_width(r.atomic_number, r.edge.lower()) == r.width
+
+
+def test_corehole_width_many(xdb):
+    levels = xdb.level_tables().levels
+    out = xdb.corehole_width_many()
+    elements = sorted(set(r.atomic_number for r in
+                          xdb.query(KeskiRahkonenKrauseTable).all()))
+    assert out.shape == (len(elements), len(levels))
+    for z, row in zip(elements, out):
+        for edge, width in zip(levels, row):
+            expected = xdb.corehole_width(z, edge)
+            if isinstance(expected, float):
+                assert width == expected, (z, edge)
+            else:
+                assert np.isnan(width), (z, edge)
+
+    edges = ['K', 'l3', 'M5', 'X9']
+    out = xdb.corehole_width_many(['Fe', 79, 'u'], edges)
+    assert out.shape == (3, 4)
+    for elem, row in zip(['Fe', 79, 'U'], out):
+        for edge, width in zip(edges, row):
+            expected = xdb.corehole_width(elem, edge)
+            if isinstance(expected, float):
+                assert width == expected, (elem, edge)
+            else:
+                assert np.isnan(width), (elem, edge)
+    with pytest.raises(ValueError):
+        xdb.corehole_width_many(['Xx'], edges)
@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+from nist_lookup.xraydb_plugin import xray_line, fluo_yield, fluo_yield_many
+
+
+@pytest.mark.parametrize('z', [26, np.int64(26), np.int32(26), np.uint8(26)])
+def test_atomic_number_types(xdb, z):
+    assert xdb.line_index().symbol(z) == 'Fe'
+    assert xray_line(z, 'Ka', xdb=xdb) == xray_line('Fe', 'Ka', xdb=xdb)
+    assert (fluo_yield(z, 'K', 'Ka', 8000, xdb=xdb) ==
+            fluo_yield('Fe', 'K', 'Ka', 8000, xdb=xdb))
+
+
+def test_fluo_yield_many(xdb):
+    energy = np.array([6800.0, 8000.0, 30000.0])
+    out = fluo_yield_many(np.array([26, 47]), ['K', 'L3'], ['Ka', 'La'],
+                          energy, xdb=xdb)
+    for row, (sym, edge, line) in zip(out, [('Fe', 'K', 'Ka'),
+                                            ('Ag', 'L3', 'La')]):
+        fyield, ener, prob = fluo_yield(sym, edge, line, energy, xdb=xdb)
+        assert np.array_equal(row['yield'], fyield)
+        assert row['energy'] == ener and row['probability'] == prob
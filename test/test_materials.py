@@ -0,0 +1,163 @@
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+from nist_lookup import materials
+from nist_lookup.materials import (Material, MaterialsRegistry,
+                                   material_mu, material_mu_components,
+                                   material_add, material_get,
+                                   set_materials_files)
+from nist_lookup.xraydb_plugin import xray_delta_beta
+
+ENERGIES = np.geomspace(2000.0, 60000.0, 301)
+
+
+@pytest.mark.parametrize('name, density', [('SiO2', 2.2), ('water', None),
+                                           ('La1.9Sr0.1CuO4', 6.9),
+                                           ('PuO2', 11.5)])
+def test_mu(xdb, name, density):
+    mat = Material(name, density, xdb=xdb)
+    for kind in ('total', 'photo'):
+        expected = material_mu(name, ENERGIES, density, kind=kind, xdb=xdb)
+        assert np.array_equal(mat.mu(ENERGIES, kind=kind), expected)
+    assert mat.mu(20000.0) == material_mu(name, 20000.0, density, xdb=xdb)
+
+
+@pytest.mark.parametrize('name, density', [('quartz', None), ('PuO2', 11.5)])
+def test_components(xdb, name, density):
+    result = Material(name, density, xdb=xdb).components(ENERGIES)
+    expected = material_mu_components(name, ENERGIES, density, xdb=xdb)
+    assert result['elements'] == expected['elements']
+    assert result['mass'] == expected['mass']
+    assert result['density'] == expected['density']
+    for elem in expected['elements']:
+        assert result[elem][:2] == expected[elem][:2]
+        assert np.array_equal(result[elem][2], expected[elem][2])
+
+
+@pytest.mark.parametrize('name, density', [('SiO2', 2.2), ('Fe2O3', 5.2),
+                                           ('Au', 19.3)])
+def test_delta_beta(xdb, name, density):
+    mat = Material(name, density, xdb=xdb)
+    for photo_only in (False, True):
+        expected = xray_delta_beta(name, density, ENERGIES, xdb=xdb,
+                                   photo_only=photo_only)
+        for chunk_size in (None, 50):
+            result = mat.delta_beta(ENERGIES, photo_only=photo_only,
+                                    chunk_size=chunk_size)
+            for res, exp in zip(result, expected):
+                assert np.array_equal(res, exp)
+
+
+def test_no_chantler_data(xdb):
+    mat = Material('PuO2', 11.5, xdb=xdb)
+    with pytest.raises(ValueError, match='Pu'):
+        mat.delta_beta(ENERGIES)
+
+
+def test_pickle(xdb):
+    mat = Material('Fe2O3', 5.2, xdb=xdb)
+    other = pickle.loads(pickle.dumps(mat))
+    assert other.formula == mat.formula and other.density == mat.density
+    assert np.array_equal(other.mu(ENERGIES), mat.mu(ENERGIES))
+    for res, exp in zip(other.delta_beta(ENERGIES), mat.delta_beta(ENERGIES)):
+        assert np.array_equal(res, exp)
+    pu = pickle.loads(pickle.dumps(Material('PuO2', 11.5, xdb=xdb)))
+    assert np.array_equal(pu.mu(ENERGIES),
+                          material_mu('PuO2', ENERGIES, 11.5, xdb=xdb))
+
+
+def write_materials(fname, *lines):
+    with open(fname, 'w') as fh:
+        fh.write('# name | formula | density\n')
+        for line in lines:
+            fh.write(' %s\n' % line)
+
+
+def count_reads(monkeypatch):
+    "list of the file names read_materials() is called with"
+    reads = []
+    read_materials = materials.read_materials
+
+    def counting(fname):
+        reads.append(fname)
+        return read_materials(fname)
+    monkeypatch.setattr(materials, 'read_materials', counting)
+    return reads
+
+
+def test_registry_reload(tmp_path, monkeypatch):
+    fname = str(tmp_path / 'materials.dat')
+    write_materials(fname, 'glass | SiO2 | 2.2')
+    reads = count_reads(monkeypatch)
+    registry = MaterialsRegistry([fname])
+    assert registry.get('Glass') == ('SiO2', 2.2)
+    assert registry.get('glass') == ('SiO2', 2.2)
+    assert reads == [fname]
+
+    # same size, new modification time
+    stat = os.stat(fname)
+    write_materials(fname, 'glass | SiO2 | 2.5')
+    os.utime(fname, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert registry.get('glass') == ('SiO2', 2.5)
+    assert len(reads) == 2
+
+    # new size, same modification time
+    stat = os.stat(fname)
+    write_materials(fname, 'glass | SiO2 | 2.25')
+    os.utime(fname, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert registry.get('glass') == ('SiO2', 2.25)
+    assert len(reads) == 3
+
+    # removed
+    os.remove(fname)
+    assert registry.get('glass') is None
+    assert len(reads) == 3
+
+
+def test_registry_user_overrides(tmp_path):
+    bundled = str(tmp_path / 'bundled.dat')
+    user = str(tmp_path / 'user.dat')
+    write_materials(bundled, 'glass | SiO2 | 2.2', 'water | H2O | 1.0')
+    registry = MaterialsRegistry([bundled, user])
+    assert registry.get('glass') == ('SiO2', 2.2)
+    write_materials(user, 'Glass | B2O3 | 2.5')
+    assert registry.get('glass') == ('B2O3', 2.5)
+    assert registry.get('water') == ('H2O', 1.0)
+    assert sorted(registry.all()) == ['glass', 'water']
+
+
+def test_registry_add(tmp_path, monkeypatch):
+    bundled = str(tmp_path / 'bundled.dat')
+    user = str(tmp_path / 'new' / 'user.dat')
+    write_materials(bundled, 'glass | SiO2 | 2.2')
+    reads = count_reads(monkeypatch)
+    registry = MaterialsRegistry([bundled, user])
+    registry.add('glass', 'B2 O3', 2.5)
+    registry.add('spinel', 'MgAl2O4', 3.6)
+    # the user file is created and appended to, not read back
+    assert reads == [bundled]
+    assert registry.get('glass') == ('B2O3', 2.5)
+    assert registry.get('spinel') == ('MgAl2O4', 3.6)
+    assert reads == [bundled]
+    # and another registry reads the same from the files
+    other = MaterialsRegistry([bundled, user])
+    assert other.all() == registry.all()
+    with open(user) as fh:
+        assert fh.read().count('|') == 4
+
+
+def test_material_add(tmp_path, monkeypatch):
+    bundled = str(tmp_path / 'bundled.dat')
+    user = str(tmp_path / 'user.dat')
+    write_materials(bundled, 'glass | SiO2 | 2.2')
+    # restored after the test
+    monkeypatch.setattr(materials, '_registry', materials._registry)
+    set_materials_files([bundled, user])
+    assert material_get('ice') is None
+    material_add('ice', 'H2O', 0.92)
+    assert material_get('ice') == ('H2O', 0.92)
+    assert Material('ice').density == 0.92
+    assert os.path.exists(user)
@@ -0,0 +1,156 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from nist_lookup import result_cache
+from nist_lookup.result_cache import ResultCache
+from nist_lookup.xraydb_plugin import xray_delta_beta
+from nist_lookup.materials import material_mu
+
+
+def tmpfiles(cache):
+    return [f for f in os.listdir(cache.directory) if f.endswith('.tmp')]
+
+
+def test_put_get(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    cache.put('a', np.arange(5.0))
+    cache.put('b', (np.arange(3.0), np.float64(2.5)))
+    assert np.array_equal(cache.get('a'), np.arange(5.0))
+    arr, val = cache.get('b')
+    assert np.array_equal(arr, np.arange(3.0)) and val == 2.5
+    assert cache.get('c') is None
+    assert tmpfiles(cache) == []
+
+
+def test_key(xdb, tmp_path):
+    cache = ResultCache(str(tmp_path))
+    energy = np.linspace(1000, 2000, 11)
+    key = cache.key(xdb, 'mu', 'SiO2', 2.2, energy)
+    assert key == cache.key(xdb, 'mu', 'SiO2', 2.2, list(energy))
+    assert key != cache.key(xdb, 'mu', 'SiO2', 2.3, energy)
+    assert key != cache.key(xdb, 'mu', 'SiO2', 2.2, energy[:-1])
+
+
+@pytest.mark.parametrize('content', [b'', b'PK\x03\x04 not a zip file',
+                                     b'\x93NUMPY'])
+def test_corrupt_entry_is_miss(tmp_path, content):
+    cache = ResultCache(str(tmp_path))
+    with open(cache._path('bad'), 'wb') as fh:
+        fh.write(content)
+    assert cache.get('bad') is None
+    cache.put('bad', np.ones(3))
+    assert np.array_equal(cache.get('bad'), np.ones(3))
+
+
+def test_truncated_entry_is_miss(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    cache.put('a', np.zeros(1000))
+    with open(cache._path('a'), 'rb') as fh:
+        data = fh.read()
+    with open(cache._path('a'), 'wb') as fh:
+        fh.write(data[:len(data) // 2])
+    assert cache.get('a') is None
+
+
+def test_failed_write(tmp_path, monkeypatch):
+    cache = ResultCache(str(tmp_path))
+
+    def savez(fh, **arrays):
+        fh.write(b'partial')
+        raise OSError('disk full')
+
+    monkeypatch.setattr(result_cache.np, 'savez', savez)
+    with pytest.raises(OSError):
+        cache.put('a', np.ones(3))
+    assert os.listdir(cache.directory) == []
+
+
+def test_threads_same_key(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    errors = []
+
+    def worker(i):
+        try:
+            for _ in range(20):
+                cache.put('same', np.full(1000, 7.0))
+                assert np.array_equal(cache.get('same'), np.full(1000, 7.0))
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert tmpfiles(cache) == []
+    assert [os.path.basename(e[2]) for e in cache.entries()] == ['same.npz']
+
+
+def test_evict_lru(tmp_path):
+    cache = ResultCache(str(tmp_path), maxsize=10**9)
+    for i in range(10):
+        cache.put('k%d' % i, np.zeros(1000))
+        os.utime(cache._path('k%d' % i), ns=(i*10**9, i*10**9))
+    entry = cache.entries()[0][1]
+    assert cache.get('k0') is not None      # now most recently used
+    cache.evict(4 * entry)
+    names = sorted(os.path.basename(e[2]) for e in cache.entries())
+    assert names == ['k0.npz', 'k7.npz', 'k8.npz', 'k9.npz']
+
+
+def test_size_tracked(tmp_path):
+    cache = ResultCache(str(tmp_path), maxsize=10**9)
+    for i in range(5):
+        cache.put('k%d' % i, np.zeros(100))
+    cache.put('k0', np.zeros(200))
+    assert cache._size == cache.size()
+
+    entry = os.path.getsize(cache._path('k1'))
+    small = ResultCache(str(tmp_path), maxsize=3 * entry, low_water=0.5)
+    small.put('new', np.zeros(100))
+    assert small.size() <= 1.5 * entry
+    assert small.get('new') is not None
+
+
+def test_stale_tmp(tmp_path):
+    cache = ResultCache(str(tmp_path), maxsize=10**9)
+    cache.put('a', np.zeros(100))
+    for name, age in (('old.tmp', 7200), ('new.tmp', 0)):
+        path = os.path.join(cache.directory, name)
+        with open(path, 'wb') as fh:
+            fh.write(b'x' * 100)
+        stamp = os.stat(path).st_mtime - age
+        os.utime(path, (stamp, stamp))
+    assert cache.size() == os.path.getsize(cache._path('a')) + 200
+    cache.clear()
+    assert os.listdir(cache.directory) == ['new.tmp']
+
+
+def test_delta_beta_cached(xdb, tmp_path):
+    cache = ResultCache(str(tmp_path))
+    energy = np.geomspace(1000, 50000, 200)
+    expected = xray_delta_beta('SiO2', 2.2, energy, xdb=xdb)
+    first = xray_delta_beta('SiO2', 2.2, energy, xdb=xdb, cache=cache)
+    assert len(cache.entries()) == 1
+    second = xray_delta_beta('SiO2', 2.2, energy, xdb=xdb, cache=cache)
+    for exp, a, b in zip(expected, first, second):
+        assert np.array_equal(exp, a) and np.array_equal(exp, b)
+    out = tuple(np.empty(200) for _ in range(3))
+    third = xray_delta_beta('SiO2', 2.2, energy, xdb=xdb, cache=cache,
+                            out=out)
+    assert third[0] is out[0] and np.array_equal(out[1], expected[1])
+
+
+def test_material_mu_cached(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    energy = np.geomspace(1000, 50000, 200)
+    expected = material_mu('kapton', energy)
+    assert np.array_equal(material_mu('kapton', energy, cache=cache),
+                          expected)
+    assert np.array_equal(material_mu('kapton', energy, cache=cache),
+                          expected)
+    assert len(cache.entries()) == 1
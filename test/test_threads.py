@@ -0,0 +1,78 @@
+import threading
+
+import numpy as np
+import pytest
+
+from nist_lookup.xraydb import xrayDB
+
+ENERGIES = np.linspace(1000, 100000, 101)
+ELEMENTS = ('H', 'C', 'O', 'Si', 'Fe', 'Cu', 'Ag', 'Au', 'U')
+
+
+def compute(xdb, elem):
+    return (xdb.f1_chantler(elem, ENERGIES),
+            xdb.mu_elam(elem, ENERGIES),
+            xdb.xray_lines(elem))
+
+
+def same(result, expected):
+    return (np.array_equal(result[0], expected[0]) and
+            np.array_equal(result[1], expected[1]) and
+            result[2] == expected[2])
+
+
+@pytest.fixture(scope='module')
+def expected(xdb):
+    return dict((elem, compute(xdb, elem)) for elem in ELEMENTS)
+
+
+def run_threads(target, nthreads):
+    threads = [threading.Thread(target=target, args=(i,))
+               for i in range(nthreads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+@pytest.mark.parametrize('kws', [{}, {'preload': True}])
+def test_shared_and_own_instances(expected, kws):
+    # threads sharing one xrayDB, and threads creating their own
+    shared = xrayDB(**kws)
+    failures = []
+
+    def worker(i):
+        xdb = xrayDB(**kws) if i % 4 == 0 else shared
+        try:
+            for _ in range(2):
+                for elem in ELEMENTS:
+                    if not same(compute(xdb, elem), expected[elem]):
+                        failures.append((i, elem))
+        except Exception as exc:
+            failures.append((i, repr(exc)))
+        finally:
+            # the session (and connection) of this thread
+            xdb.close()
+
+    try:
+        run_threads(worker, 32)
+    finally:
+        shared.close()
+    assert failures == []
+
+
+def test_shared_session_per_thread():
+    xdb = xrayDB()
+    sessions = {}
+
+    def worker(i):
+        try:
+            sessions[i] = xdb.session()
+        finally:
+            xdb.close()
+
+    try:
+        run_threads(worker, 8)
+    finally:
+        xdb.close()
+    assert len(set(id(s) for s in sessions.values())) == 8